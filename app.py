@@ -7,13 +7,29 @@ import time
 from dotenv import load_dotenv
 import subprocess
 import shutil
-from flask_socketio import SocketIO, emit  # Don't rename SocketIO
+from flask_socketio import SocketIO, emit, join_room  # Don't rename SocketIO
+import threading
+
+# Before the imports below: they read their settings (BUSFACTOR_DATA_DIR, JOB_*, ...)
+# from the environment when imported, so .env has to be loaded first.
+load_dotenv()
+
 from generate_graphs import generate_graph_set
+from edge_builder import edge_options_with_defaults
+from github_client import INTERACTIVE, RateLimitExceeded, github_client
+from jobs import BudgetExceeded, JobCancelled, QueueFullError, job_manager, normalize_repo_url, single_flight
+from progress import ProgressReporter
+from json_stream import compressed_response, streamed_json_response
+from graph_wire import COLUMNAR_MSGPACK, JSON, columnar_graph_set, negotiate_format, pack
+from file_ownership import UnknownAnalysis, contributor_file_page, contributor_page, file_page, load_analysis, summary
 
 from rapidfuzz import fuzz
 from generate_repomix_output import generate_repomix_output
+from token_budget import REPOMIX_TOKEN_LIMIT, largest_files
 from get_documentation_from_deepseek import get_documentation_from_deepseek
 import json
+import re
+import uuid
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'secret!'
@@ -29,9 +45,15 @@ socketio = SocketIO(app, cors_allowed_origins="*")
 
 # GitHub token and base directory
 
-load_dotenv()
 token =os.getenv('GITHUB_TOKEN')
 
+# Repository URLs handed to git: https://github.com/<owner>/<repo>, nothing else
+GITHUB_REPO_URL = re.compile(r"^https://github\.com/[A-Za-z0-9_.-]+/[A-Za-z0-9_.-]+?(?:\.git)?/?$")
+
+
+def is_github_repo_url(url):
+    return bool(GITHUB_REPO_URL.match(url))
+
 @app.route("/repo_data", methods=["POST"])
 def get_repo_data():
     data = request.get_json()  # Parse JSON body
@@ -49,13 +71,11 @@ def get_repo_data():
     repo_api_url = url.replace('https://github.com/', 'https://api.github.com/repos/')
     print(f"Repo API URL: {repo_api_url}")
     
-    headers = {
-        'Authorization': f'token {token}'
-    }
-    
     try:
-        response = requests.get(repo_api_url, headers=headers)
+        response = github_client.get(repo_api_url, priority=INTERACTIVE)
         response.raise_for_status()  # Raise an HTTPError for bad responses (4xx and 5xx)
+    except RateLimitExceeded as e:
+        return jsonify({"error": str(e)}), 429, {"Retry-After": str(e.retry_after)}
     except requests.exceptions.RequestException as e:
         print(f"Error: {e}")
         return jsonify({"error": str(e)}), 500
@@ -86,11 +106,11 @@ def search_repositories():
     if not value:
         return jsonify([])
 
-    response = requests.get(
-        "https://api.github.com/search/repositories",
-        headers={"Authorization": f"token {token}"},
-        params={"q": value},
-    )
+    # Pooled and ETag-cached, so repeated keystrokes mostly hit the cache or get a 304
+    try:
+        response = github_client.get("search/repositories", params={"q": value}, priority=INTERACTIVE)
+    except RateLimitExceeded as e:
+        return jsonify({"error": str(e)}), 429, {"Retry-After": str(e.retry_after)}
 
     if response.status_code != 200:
         return jsonify({"error": "Failed to fetch data from GitHub"}), response.status_code
@@ -122,67 +142,213 @@ def search_repositories():
 
     return jsonify(filtered_repos)
 
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    # Prometheus text format: remaining GitHub quota per resource and queued requests
+    buckets, waiting = github_client.scheduler.snapshot()
+    lines = [
+        "# HELP github_rate_limit_remaining Remaining GitHub API requests in the current window.",
+        "# TYPE github_rate_limit_remaining gauge",
+    ]
+    lines += [f'github_rate_limit_remaining{{resource="{name}"}} {bucket["remaining"]}' for name, bucket in buckets.items()]
+    lines += ["# HELP github_rate_limit_limit GitHub API requests allowed per window.", "# TYPE github_rate_limit_limit gauge"]
+    lines += [f'github_rate_limit_limit{{resource="{name}"}} {bucket["limit"]}' for name, bucket in buckets.items()]
+    lines += ["# HELP github_rate_limit_reset_timestamp When the current window resets (Unix time).",
+              "# TYPE github_rate_limit_reset_timestamp gauge"]
+    lines += [f'github_rate_limit_reset_timestamp{{resource="{name}"}} {bucket["reset"]}' for name, bucket in buckets.items()]
+    lines += ["# HELP github_requests_waiting Requests queued for GitHub quota.", "# TYPE github_requests_waiting gauge"]
+    lines += [f'github_requests_waiting{{priority="{priority}"}} {count}' for priority, count in waiting.items()]
+    return "\n".join(lines) + "\n", 200, {"Content-Type": "text/plain; version=0.0.4"}
+
 @socketio.on('connect', namespace='/progress')
 def handle_connect():
     print("Client connected to /progress namespace")
 
+# Socket.IO session id -> progress rooms it joined, to notice when a job loses its last watcher
+room_subscribers = {}
+room_subscribers_lock = threading.Lock()
+
+@socketio.on('join', namespace='/progress')
+def handle_join(data):
+    # Subscribe this client to the progress room of one job (or /process_repo request)
+    room = (data or {}).get("job_id")
+    if room:
+        join_room(room)
+        with room_subscribers_lock:
+            room_subscribers.setdefault(request.sid, set()).add(room)
+        print(f"Client joined progress room {room}")
+        # Clients learn the job id from the 202, so events sent before they joined
+        # (up to the final one for a cached result) would be lost: replay the latest.
+        job = job_manager.get(room)
+        if job is not None and job.progress is not None:
+            job.progress.replay(request.sid)
+
+@socketio.on('disconnect', namespace='/progress')
+def handle_disconnect():
+    # A job whose last subscriber went away (e.g. the tab was closed) is cancelled.
+    # Jobs nobody ever subscribed to are only polled and keep running.
+    with room_subscribers_lock:
+        rooms = room_subscribers.pop(request.sid, set())
+        watched = set().union(*room_subscribers.values()) if room_subscribers else set()
+    for room in rooms - watched:
+        job = job_manager.get(room)
+        if job is not None and job.status in ("queued", "running"):
+            print(f"Last subscriber left, cancelling job {room}")
+            job.context.cancel()
+
 @app.route("/generate_graphs", methods=["POST"])
 def generate_graphs():
     data = request.get_json()
     repo_url = data.get("url", "").strip()
+    # Optional hub-file damping / edge thresholds, see edge_builder.DEFAULT_EDGE_OPTIONS
+    edge_options = data.get("edge_options")
+    # The per-file maps are served page by page from /analyses/<analysis_id>/...;
+    # older clients can still ask for them inline.
+    include_file_details = bool(data.get("include_file_details"))
 
     if not repo_url:
         return jsonify({"error": "Repository URL required"}), 400
+    if not is_github_repo_url(repo_url):
+        return jsonify({"error": "Invalid URL. It must be https://github.com/<owner>/<repo>."}), 400
+    # Bad options are rejected here, not after the job has been queued
+    try:
+        edge_options = edge_options_with_defaults(edge_options)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
-    def send_progress(message):
-        print(f"Emitting progress: {message}")
-        socketio.emit('progress', {'message': message}, namespace='/progress')
-        socketio.sleep(0)  # Allow event loop to process
+    def run_analysis(job):
+        # Progress goes to the job's room only; clients join it with the 'join' event.
+        send_progress = ProgressReporter(socketio, job.id, extra={'job_id': job.id})
+        job.progress = send_progress
 
+        try:
+            send_progress("Starting graph generation...")
+            graphs = generate_graph_set(repo_url, send_progress, edge_options=edge_options, job=job.context)
+            send_progress.final("Graph generation complete!")
+            return graphs if include_file_details else summary(graphs)
+        except JobCancelled:
+            send_progress.final("Graph generation cancelled.")
+            raise
+        except BudgetExceeded as e:
+            send_progress.final(f"Stopped: {str(e)}")
+            raise
+        except Exception as e:
+            send_progress.final(f"Error: {str(e)}")
+            raise
 
+    # The analysis runs on the bounded job pool; poll GET /jobs/<job_id> for the result.
+    # Identical requests while one is in flight get the same job (and progress room).
+    dedupe_key = (normalize_repo_url(repo_url), json.dumps(edge_options, sort_keys=True), include_file_details)
     try:
-        send_progress("Starting graph generation...")
-        graphs = generate_graph_set(repo_url, send_progress)
-        send_progress("Graph generation complete!")
-        #print('graphs')
-        print(graphs)
-        return jsonify(graphs)
-    except Exception as e:
-        send_progress(f"Error: {str(e)}")
-        return jsonify({"error": str(e)}), 500
+        job = job_manager.submit(run_analysis, dedupe_key=dedupe_key)
+    except QueueFullError as e:
+        return jsonify({"error": str(e)}), 429, {"Retry-After": "30"}
+
+    return jsonify({"job_id": job.id, "status": job.status, "status_url": f"/jobs/{job.id}"}), 202
+
+@app.route("/jobs/<job_id>", methods=["GET"])
+def get_job(job_id):
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    # Finished jobs carry the whole graph set: stream it with orjson, gzip/brotli compressed.
+    # Clients can ask for the compact columnar graph format through Accept (see graph_wire.py).
+    body = job.to_dict()
+    wire_format = negotiate_format(request.accept_mimetypes)
+    accept_encoding = request.headers.get("Accept-Encoding")
+    vary = "Accept, Accept-Encoding"
+    if wire_format != JSON and body.get("result") is not None:
+        body["result"] = columnar_graph_set(body["result"])
+    if wire_format == COLUMNAR_MSGPACK:
+        return compressed_response([pack(body)], accept_encoding, mimetype=wire_format, vary=vary)
+    return streamed_json_response(body, accept_encoding, mimetype=wire_format, vary=vary)
+
+@app.route("/jobs/<job_id>", methods=["DELETE"])
+def cancel_job(job_id):
+    # Cancellation is cooperative: the job stops at its next checkpoint (see jobs.JobContext)
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    job.context.cancel()
+    return jsonify(job.to_dict()), 202
+
+@app.route("/analyses/<analysis_id>/files", methods=["GET"])
+def analysis_files(analysis_id):
+    # ?contributor=<node id> narrows to one contributor's files; prefix, top, page, per_page
+    try:
+        graphs = load_analysis(analysis_id)
+        contributor = request.args.get("contributor")
+        if contributor:
+            body = contributor_file_page(graphs, contributor, request.args)
+        else:
+            body = file_page(graphs, request.args)
+    except UnknownAnalysis as e:
+        return jsonify({"error": str(e)}), 404
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    body["analysis_id"] = analysis_id
+    return streamed_json_response(body, request.headers.get("Accept-Encoding"))
+
+@app.route("/analyses/<analysis_id>/contributors", methods=["GET"])
+def analysis_contributors(analysis_id):
+    try:
+        body = contributor_page(load_analysis(analysis_id), request.args)
+    except UnknownAnalysis as e:
+        return jsonify({"error": str(e)}), 404
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    body["analysis_id"] = analysis_id
+    return streamed_json_response(body, request.headers.get("Accept-Encoding"))
 
 @app.route('/process_repo', methods=['POST'])
 def process_repo():
     data = request.get_json()
     repo_url = data.get("repo_url")
+    # Clients pick a progress room id up front and join it before posting
+    progress_id = data.get("progress_id") or uuid.uuid4().hex
 
     if not repo_url:
         return jsonify({"error": "Repository URL is required"}), 400
+    if not is_github_repo_url(repo_url):
+        return jsonify({"error": "Invalid URL. It must be https://github.com/<owner>/<repo>."}), 400
     
-    def send_progress(message):
-        print(f"Emitting progress: {message}")
-        socketio.emit('progress', {'message': message}, namespace='/progress')
-        socketio.sleep(0)  # Allow event loop to process
-        
-    try:
-        repo_data, token_count = generate_repomix_output(repo_url,send_progress)
-    except subprocess.CalledProcessError as e:
-        return jsonify({"error": f"Repository processing failed: {str(e)}"}), 500
-    except Exception as e:
-        return jsonify({"error": f"Unexpected error: {str(e)}"}), 500
+    def run(send_progress):
+        try:
+            tokens = generate_repomix_output(repo_url,send_progress)
+        except subprocess.CalledProcessError as e:
+            return {"error": f"Repository processing failed: {str(e)}"}, 500
+        except Exception as e:
+            return {"error": f"Unexpected error: {str(e)}"}, 500
 
-    if token_count > 120_000:
-        print(f"Token count exceeded: {token_count}")
-        return jsonify({"error": f"Token count exceeded: {token_count}"}), 413  # 413 Payload Too Large
+        if tokens.exceeded:
+            # Counting stopped at the limit; the largest files show what to leave out
+            print(f"Token count exceeded: over {REPOMIX_TOKEN_LIMIT}")
+            return {
+                "error": f"Token count exceeded: more than {REPOMIX_TOKEN_LIMIT} tokens",
+                "token_count": tokens.total,
+                "largest_files": largest_files(tokens),
+            }, 413  # 413 Payload Too Large
+        repo_data = tokens.text
 
-    try:
-        documentation = get_documentation_from_deepseek(repo_data,send_progress)
-        print(documentation)
-        return jsonify(documentation)
-    except subprocess.CalledProcessError as e:
-        return jsonify({"error": f"Documentation generation failed: {str(e)}"}), 500
-    except Exception as e:
-        return jsonify({"error": f"Unexpected error during documentation: {str(e)}"}), 500
+        try:
+            documentation = get_documentation_from_deepseek(repo_data,send_progress)
+            print(documentation)
+            return documentation, 200
+        except subprocess.CalledProcessError as e:
+            return {"error": f"Documentation generation failed: {str(e)}"}, 500
+        except Exception as e:
+            return {"error": f"Unexpected error during documentation: {str(e)}"}, 500
+
+    # Concurrent requests for the same repository share one clone + documentation run;
+    # callers that join also receive its progress events in their own room.
+    send_progress = ProgressReporter(socketio, progress_id, extra={'job_id': progress_id})
+    body, status = single_flight.run(
+        ("process_repo", normalize_repo_url(repo_url)),
+        run,
+        context=send_progress,
+        on_join=lambda leader, follower: leader.add_room(progress_id),
+    )
+    return jsonify(body), status
         
 if __name__ == "__main__":
     socketio.run(app, debug=True)
@@ -0,0 +1,76 @@
+"""
+Compares clone strategies for graph generation against the plain full bare clone.
+
+For each strategy it reports the bytes received (size of the object database once the
+first commit of the analysis window has been mined, which includes any blobs fetched
+lazily for its numstat) and the time until that first commit is available, and checks
+that the strategy mines exactly the commits and numstat of the full clone inside the
+analysis window.
+
+Usage: python benchmark_clone.py https://github.com/owner/repo
+"""
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from commit_miner import history_window, iter_commits
+from mirror_store import CLONE_STRATEGIES, MirrorStore, directory_size, remove_readonly
+
+
+def _first_commit(git_dir):
+    _, cutoff, count = history_window(git_dir)
+    for commit in iter_commits(git_dir, since=cutoff, max_count=count):
+        return commit
+    return None
+
+
+def _window(git_dir):
+    _, cutoff, count = history_window(git_dir)
+    return list(iter_commits(git_dir, since=cutoff, max_count=count))
+
+
+def benchmark_bare_clone(repo_url, work_dir):
+    start = time.perf_counter()
+    path = os.path.join(work_dir, "bare.git")
+    subprocess.run(["git", "clone", "--bare", "--quiet", "--", repo_url, path], check=True)
+    _first_commit(path)
+    elapsed = time.perf_counter() - start
+    return directory_size(os.path.join(path, "objects")), elapsed, _window(path)
+
+
+def benchmark_strategy(repo_url, work_dir, strategy):
+    store = MirrorStore(root=os.path.join(work_dir, "mirrors"), max_bytes=float("inf"))
+    start = time.perf_counter()
+    path = store.acquire("benchmark/repo", repo_url, strategy=strategy).path
+    try:
+        _first_commit(path)
+        elapsed = time.perf_counter() - start
+        return directory_size(os.path.join(path, "objects")), elapsed, _window(path)
+    finally:
+        store.release("benchmark/repo", strategy)
+
+
+def main(repo_url):
+    work_dir = tempfile.mkdtemp()
+    try:
+        results = [("bare (current)",) + benchmark_bare_clone(repo_url, work_dir)]
+        for strategy in CLONE_STRATEGIES:
+            results.append((strategy,) + benchmark_strategy(repo_url, work_dir, strategy))
+    finally:
+        shutil.rmtree(work_dir, onerror=remove_readonly)
+
+    print(f"{'strategy':<20}{'bytes received':>18}{'first commit (s)':>20}{'window':>12}")
+    expected = results[0][3]
+    for name, size, elapsed, window in results:
+        print(f"{name:<20}{size:>18,}{elapsed:>20.2f}{'identical' if window == expected else 'DIFFERS':>12}")
+    assert all(window == expected for *_, window in results), "a strategy mined a different analysis window"
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print(__doc__)
+        sys.exit(1)
+    main(sys.argv[1])
@@ -0,0 +1,77 @@
+"""
+Compares the memory held by the mined commits of a synthetic 100k-commit window as the
+old per-commit dicts (`commits_data`) and as a CommitTable, and checks that both give
+the same aggregates.
+
+Usage: python benchmark_commit_table.py [commits]
+"""
+import random
+import sys
+import time
+import tracemalloc
+from collections import defaultdict
+from datetime import datetime, timezone
+
+from commit_miner import CommitRecord
+from commit_table import CommitAggregates, CommitTable
+
+
+def synthetic_records(n_commits, seed=42):
+    rng = random.Random(seed)
+    authors = [(f"Developer {i}", f"dev{i}@example.com") for i in range(n_commits // 100 + 1)]
+    paths = [f"src/module_{i // 50}/file_{i}.py" for i in range(n_commits // 5 + 1)]
+    for i in range(n_commits):
+        name, email = rng.choice(authors)
+        files = [(rng.choice(paths), rng.randint(0, 200), rng.randint(0, 100)) for _ in range(rng.randint(1, 12))]
+        yield CommitRecord(f"{i:040x}", name, email, 1_700_000_000 + i * 60, files)
+
+
+def _authors(name, email):
+    return (name, email, name.replace(" ", "").lower(), False)
+
+
+def dict_rows(records):
+    commits_data = []
+    for commit in records:
+        commits_data.append({
+            "datetime": datetime.fromtimestamp(commit.timestamp, tz=timezone.utc),
+            "author_name": commit.author_name,
+            "author_email": commit.author_email,
+            "files": [path for path, _, _ in commit.files],
+        })
+    return commits_data
+
+
+def dict_files(commits_data):
+    files = defaultdict(set)
+    for commit in commits_data:
+        files[_authors(commit["author_name"], commit["author_email"])[2]].update(commit["files"])
+    return files
+
+
+def measure(build):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = build()
+    elapsed = time.perf_counter() - start
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, current, elapsed
+
+
+def main(n_commits=100_000):
+    commits_data, dict_bytes, dict_time = measure(lambda: dict_rows(synthetic_records(n_commits)))
+    table, table_bytes, table_time = measure(lambda: CommitTable.from_records(synthetic_records(n_commits)))
+
+    print(f"{n_commits:,} commits")
+    print(f"per-commit dicts : {dict_bytes / 2**20:8.1f} MiB  {dict_time:6.2f}s")
+    print(f"CommitTable      : {table_bytes / 2**20:8.1f} MiB  {table_time:6.2f}s  "
+          f"({dict_bytes / table_bytes:.1f}x smaller)")
+
+    authors = {author: _authors(*author) for author in table.authors.values}
+    identical = dict(CommitAggregates(table, authors).unique_files_per_contributor) == dict(dict_files(commits_data))
+    print("files per contributor identical" if identical else "RESULTS DIFFER")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:2]))
@@ -0,0 +1,174 @@
+import codecs
+import os
+import subprocess
+from collections import namedtuple
+
+# One record per commit. `files` is a list of (path, insertions, deletions).
+CommitRecord = namedtuple("CommitRecord", ["sha", "author_name", "author_email", "timestamp", "files"])
+
+# The analysis only looks at the last 1.5 years of history before the newest commit.
+HISTORY_WINDOW_DAYS = 547
+
+# ASCII record/unit separators keep the header line unambiguous for any author name.
+RECORD_SEP = "\x1e"
+FIELD_SEP = "\x1f"
+LOG_FORMAT = "--format=" + RECORD_SEP + "%H" + FIELD_SEP + "%an" + FIELD_SEP + "%ae" + FIELD_SEP + "%ct"
+
+
+def _unquote_path(path):
+    # git still C-quotes paths containing control characters or quotes.
+    if len(path) >= 2 and path[0] == '"' and path[-1] == '"':
+        raw = codecs.escape_decode(path[1:-1].encode("utf-8"))[0]
+        return raw.decode("utf-8", errors="replace")
+    return path
+
+
+def _git(git_dir, *args):
+    result = subprocess.run(
+        ["git", "--git-dir", git_dir, *args],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        encoding="utf-8",
+        check=True,
+    )
+    return result.stdout.strip()
+
+
+def _log_command(git_dir, *args, since=None, max_count=None, numstat=True):
+    # --diff-merges=first-parent reports merges against their first parent, which is
+    # what GitPython's commit.stats did, and --no-renames matches its numstat output.
+    cmd = ["git", "--git-dir", git_dir, "-c", "core.quotePath=false", "log", LOG_FORMAT]
+    if numstat:
+        cmd += ["--numstat", "--no-renames", "--diff-merges=first-parent"]
+    if since is not None:
+        cmd.append(f"--since=@{int(since)}")
+    if max_count is not None:
+        cmd.append(f"--max-count={int(max_count)}")
+    cmd += args
+    return cmd
+
+
+def parse_log_output(lines):
+    """
+    Parses `git log --numstat` output produced with LOG_FORMAT into CommitRecords.
+    """
+    record = None
+    for line in lines:
+        line = line.rstrip("\n")
+        if line.startswith(RECORD_SEP):
+            if record is not None:
+                yield record
+            sha, name, email, timestamp = line[1:].split(FIELD_SEP)
+            record = CommitRecord(sha, name, email, int(timestamp), [])
+        elif line and record is not None:
+            insertions, deletions, path = line.split("\t", 2)
+            # Binary files are reported as "-" and counted as zero lines, like GitPython.
+            record.files.append((
+                _unquote_path(path),
+                int(insertions) if insertions != "-" else 0,
+                int(deletions) if deletions != "-" else 0,
+            ))
+    if record is not None:
+        yield record
+
+
+def shallow_boundary(git_dir):
+    """
+    SHAs whose parents a shallow clone doesn't have (listed in `<git_dir>/shallow`).
+    Their numstat is taken against an empty tree, so every file shows as added.
+    """
+    try:
+        with open(os.path.join(git_dir, "shallow"), "r", encoding="utf-8") as file:
+            return frozenset(line.strip() for line in file if line.strip())
+    except FileNotFoundError:
+        return frozenset()
+
+
+def has_commit(git_dir, sha):
+    """
+    Whether commit `sha` is in the repository.
+    """
+    result = subprocess.run(
+        ["git", "--git-dir", git_dir, "cat-file", "-e", f"{sha}^{{commit}}"],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    return result.returncode == 0
+
+
+def history_window(git_dir, rev="HEAD", days=HISTORY_WINDOW_DAYS):
+    """
+    Works out the analysis window without walking the history in Python.
+
+    :return: (newest_timestamp, cutoff_timestamp, commit_count) where commit_count is
+             the number of commits git lists since the cutoff.
+    """
+    newest = int(_git(git_dir, "log", "-1", "--format=%ct", rev))
+    cutoff = newest - days * 24 * 60 * 60
+    count = int(_git(git_dir, "rev-list", "--count", f"--since=@{cutoff}", rev))
+    return newest, cutoff, count
+
+
+def _stream_records(cmd, since=None, stdin_data=None):
+    process = subprocess.Popen(
+        cmd,
+        stdin=subprocess.PIPE if stdin_data is not None else None,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        encoding="utf-8",
+        errors="replace",
+    )
+    if stdin_data is not None:
+        # git reads all of --stdin before it starts writing, so this cannot deadlock.
+        process.stdin.write(stdin_data)
+        process.stdin.close()
+    exhausted = False
+    try:
+        for record in parse_log_output(process.stdout):
+            # --since is a traversal hint for git; keep the hard cutoff here as well.
+            if since is not None and record.timestamp < since:
+                break
+            yield record
+        else:
+            exhausted = True
+    finally:
+        # Stop git early if the caller did not consume the whole history.
+        if not exhausted:
+            process.kill()
+        process.stdout.close()
+        stderr = process.stderr.read()
+        process.stderr.close()
+        returncode = process.wait()
+    if exhausted and returncode != 0:
+        raise subprocess.CalledProcessError(returncode, process.args, stderr=stderr)
+
+
+def iter_commits(git_dir, rev="HEAD", since=None, max_count=None):
+    """
+    Streams commits reachable from `rev` (newest first) with their per-file numstat,
+    using a single `git log` process instead of one `git diff` per commit.
+
+    :param git_dir: Path to the (bare) repository.
+    :param since: Optional unix timestamp; older commits are not listed.
+    :param max_count: Optional upper bound on the number of commits listed.
+    """
+    cmd = _log_command(git_dir, rev, since=since, max_count=max_count)
+    return _stream_records(cmd, since)
+
+
+def list_commits(git_dir, rev="HEAD", since=None, max_count=None):
+    """
+    Returns the (sha, timestamp) pairs iter_commits() would yield, without numstat.
+    """
+    cmd = _log_command(git_dir, rev, since=since, max_count=max_count, numstat=False)
+    return [(record.sha, record.timestamp) for record in _stream_records(cmd, since)]
+
+
+def iter_commits_by_sha(git_dir, shas):
+    """
+    Streams the numstat records of exactly the given commits, in the given order.
+    """
+    if not shas:
+        return iter(())
+    cmd = _log_command(git_dir, "--no-walk=unsorted", "--stdin")
+    return _stream_records(cmd, stdin_data="\n".join(shas) + "\n")
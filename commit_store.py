@@ -0,0 +1,119 @@
+import json
+import os
+
+from commit_miner import CommitRecord
+from sqlite_store import SQLiteStore
+
+# Mined per-commit stats are kept here so re-analysis only mines new commits.
+COMMIT_STORE_PATH = os.path.join(os.getenv("BUSFACTOR_DATA_DIR", "data"), "commit_stats.sqlite3")
+
+# SQLite limits the number of bound parameters per statement.
+_CHUNK_SIZE = 500
+
+
+class CommitStore(SQLiteStore):
+    """
+    SQLite store of mined commit records keyed by (repo, sha).
+
+    Commits are immutable, so a stored record never needs to be refreshed, except one
+    mined at a shallow clone's boundary: its numstat counts every file as added. Such
+    records are flagged and only served to runs where the commit is still a boundary;
+    everywhere else they count as missing and are replaced by the real record. Author
+    resolution is not stored: it depends on the current GitHub contributor data and is
+    cheap to redo when aggregates are rebuilt.
+    """
+
+    def __init__(self, path=COMMIT_STORE_PATH):
+        super().__init__(path)
+
+    def _create_schema(self, connection):
+        connection.execute("""
+            CREATE TABLE IF NOT EXISTS commits (
+                repo TEXT NOT NULL,
+                sha TEXT NOT NULL,
+                author_name TEXT NOT NULL,
+                author_email TEXT NOT NULL,
+                committed_at INTEGER NOT NULL,
+                files TEXT NOT NULL,
+                boundary INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (repo, sha)
+            ) WITHOUT ROWID
+        """)
+        columns = {row[1] for row in connection.execute("PRAGMA table_info(commits)")}
+        if "boundary" not in columns:
+            connection.execute("ALTER TABLE commits ADD COLUMN boundary INTEGER NOT NULL DEFAULT 0")
+
+    @staticmethod
+    def _chunks(items):
+        for start in range(0, len(items), _CHUNK_SIZE):
+            yield items[start:start + _CHUNK_SIZE]
+
+    def missing_shas(self, repo_name, shas, boundary_shas=frozenset()):
+        """
+        Returns the SHAs from `shas` that are not stored yet, preserving their order.
+        Records stored from a shallow boundary count as missing unless they are in
+        `boundary_shas` (the boundary of the clone being analysed).
+        """
+        known = set()
+        with self._connect() as connection:
+            for chunk in self._chunks(list(shas)):
+                placeholders = ",".join("?" * len(chunk))
+                rows = connection.execute(
+                    f"SELECT sha, boundary FROM commits WHERE repo = ? AND sha IN ({placeholders})",
+                    [repo_name.lower(), *chunk],
+                )
+                known.update(sha for sha, boundary in rows if not boundary or sha in boundary_shas)
+        return [sha for sha in shas if sha not in known]
+
+    def add_commits(self, repo_name, records, boundary_shas=frozenset(), batch_size=1000):
+        """
+        Stores `records` (any iterable, e.g. a miner stream) in batches. Those in
+        `boundary_shas` are flagged as mined at a shallow boundary.
+        """
+        repo_key = repo_name.lower()
+        batch = []
+        for record in records:
+            batch.append((repo_key, record.sha, record.author_name, record.author_email, record.timestamp,
+                          json.dumps(record.files, separators=(",", ":")), int(record.sha in boundary_shas)))
+            if len(batch) >= batch_size:
+                self._insert(batch)
+                batch = []
+        if batch:
+            self._insert(batch)
+
+    def _insert(self, rows):
+        with self._lock, self._connect() as connection:
+            # A real record replaces a boundary one, never the other way round
+            connection.executemany("""
+                INSERT INTO commits VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (repo, sha) DO UPDATE SET
+                    author_name = excluded.author_name,
+                    author_email = excluded.author_email,
+                    committed_at = excluded.committed_at,
+                    files = excluded.files,
+                    boundary = excluded.boundary
+                WHERE commits.boundary = 1 AND excluded.boundary = 0
+            """, rows)
+
+    def iter_commits(self, repo_name, shas):
+        """
+        Yields the stored CommitRecords for `shas`, in the order given.
+        """
+        with self._connect() as connection:
+            for chunk in self._chunks(list(shas)):
+                placeholders = ",".join("?" * len(chunk))
+                rows = connection.execute(
+                    f"SELECT sha, author_name, author_email, committed_at, files FROM commits "
+                    f"WHERE repo = ? AND sha IN ({placeholders})",
+                    [repo_name.lower(), *chunk],
+                )
+                by_sha = {
+                    sha: CommitRecord(sha, name, email, timestamp, [tuple(f) for f in json.loads(files)])
+                    for sha, name, email, timestamp, files in rows
+                }
+                for sha in chunk:
+                    if sha in by_sha:
+                        yield by_sha[sha]
+
+
+commit_store = CommitStore()
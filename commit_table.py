@@ -0,0 +1,203 @@
+"""
+Compact, columnar in-memory form of mined commits and the per-contributor aggregates
+built from it.
+
+Authors and file paths are interned to integer IDs and commits are stored as flat
+array columns: per commit a timestamp, an author ID and an offset into the per-file
+columns (file ID, lines changed). A 100k-commit window is then a handful of arrays and
+two string tables instead of millions of dicts, tuples and lists.
+"""
+from array import array
+from collections import defaultdict
+
+import numpy as np
+
+
+class Interner:
+    """
+    Maps values to dense integer IDs in first-seen order.
+    """
+
+    def __init__(self, values=()):
+        self.values = []
+        self._ids = {}
+        for value in values:
+            self.intern(value)
+
+    def intern(self, value):
+        value_id = self._ids.get(value)
+        if value_id is None:
+            value_id = self._ids[value] = len(self.values)
+            self.values.append(value)
+        return value_id
+
+    def __len__(self):
+        return len(self.values)
+
+    def __reduce__(self):
+        # Only the list is pickled (e.g. back from a shard worker); the index is rebuilt
+        return Interner, (self.values,)
+
+
+class CommitTable:
+    """
+    Commits in mining order. `authors` holds (author_name, author_email) pairs, `files`
+    paths; commit i touched file_ids[file_offsets[i]:file_offsets[i + 1]].
+    """
+
+    def __init__(self):
+        self.authors = Interner()
+        self.files = Interner()
+        self.timestamps = array("q")
+        self.author_ids = array("i")
+        self.file_offsets = array("q", [0])
+        self.file_ids = array("i")
+        self.file_lines = array("q")
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def append(self, record):
+        """
+        Adds a CommitRecord.
+        """
+        self.timestamps.append(record.timestamp)
+        self.author_ids.append(self.authors.intern((record.author_name, record.author_email)))
+        intern_file = self.files.intern
+        for path, insertions, deletions in record.files:
+            self.file_ids.append(intern_file(path))
+            self.file_lines.append(insertions + deletions)
+        self.file_offsets.append(len(self.file_ids))
+
+    @classmethod
+    def from_records(cls, records):
+        table = cls()
+        for record in records:
+            table.append(record)
+        return table
+
+    def extend(self, other):
+        """
+        Appends the commits of another table, re-mapping its author and file IDs.
+        """
+        if not len(other):
+            return
+        author_map = np.array([self.authors.intern(author) for author in other.authors.values], dtype=np.int32)
+        file_map = np.array([self.files.intern(path) for path in other.files.values], dtype=np.int32)
+        other_author_ids, other_offsets, other_file_ids, _ = other.columns()
+        self.timestamps.extend(other.timestamps)
+        self.author_ids.frombytes(author_map[other_author_ids].tobytes())
+        self.file_offsets.frombytes((other_offsets[1:] + len(self.file_ids)).tobytes())
+        if len(other_file_ids):
+            self.file_ids.frombytes(file_map[other_file_ids].tobytes())
+        self.file_lines.extend(other.file_lines)
+
+    @classmethod
+    def concat(cls, tables):
+        table = cls()
+        for other in tables:
+            table.extend(other)
+        return table
+
+    def columns(self):
+        """
+        Zero-copy NumPy views: (author_ids, file_offsets, file_ids, file_lines).
+        """
+        return (
+            np.frombuffer(self.author_ids, dtype=np.int32),
+            np.frombuffer(self.file_offsets, dtype=np.int64),
+            np.frombuffer(self.file_ids, dtype=np.int32),
+            np.frombuffer(self.file_lines, dtype=np.int64),
+        )
+
+    def author_counts(self):
+        """
+        Returns {(author_name, author_email): commits}.
+        """
+        counts = np.bincount(self.columns()[0], minlength=len(self.authors))
+        return dict(zip(self.authors.values, counts.tolist()))
+
+
+def _first_seen(keys):
+    """
+    Returns (distinct keys in order of first occurrence, index of each key's group in
+    that order for every element).
+    """
+    unique, first_index, inverse = np.unique(keys, return_index=True, return_inverse=True)
+    order = np.argsort(first_index, kind="stable")
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    return unique[order], rank[inverse.reshape(-1)]
+
+
+class CommitAggregates:
+    """
+    Per-contributor aggregates of a CommitTable, keyed by normalised username.
+
+    Every dict and set is filled by the same insertions, in the same order, as a loop
+    over the commits in table order would do, so iteration order matches that loop too.
+    """
+
+    def __init__(self, table, authors):
+        """
+        :param authors: {(author_name, author_email): (username, email, normalised
+                        username, is_bot)} for every author in the table. Bots count
+                        towards LOC and file sizes but are left out of contributor_map
+                        and file_contributors.
+        """
+        self.commits = len(table)
+        self.loc_per_contributor = defaultdict(int)
+        self.unique_files_per_contributor = defaultdict(set)
+        self.files_per_contributor_with_sizes = defaultdict(lambda: defaultdict(int))
+        self.all_files_with_sizes = {}
+        self.contributor_map = defaultdict(set)
+        self.file_contributors = defaultdict(set)
+        if not len(table):
+            return
+
+        resolved = [authors[author] for author in table.authors.values]
+        contributors = Interner(contributor for _, _, contributor, _ in resolved)
+        contributor_of_author = np.array([contributors.intern(r[2]) for r in resolved], dtype=np.int64)
+        bot_author = np.array([r[3] for r in resolved], dtype=bool)
+
+        author_ids, offsets, file_ids, file_lines = table.columns()
+        file_ids = file_ids.astype(np.int64)
+        commit_contributor = contributor_of_author[author_ids]
+        entry_author = np.repeat(author_ids, np.diff(offsets))
+        entry_contributor = contributor_of_author[entry_author]
+        names = contributors.values
+        paths = table.files.values
+
+        # LOC: every commit counts, also those without file changes
+        contributor_order, _ = _first_seen(commit_contributor)
+        loc = np.bincount(entry_contributor, weights=file_lines, minlength=len(names)).astype(np.int64)
+        for contributor in contributor_order.tolist():
+            self.loc_per_contributor[names[contributor]] += int(loc[contributor])
+            self.unique_files_per_contributor[names[contributor]] = set()
+
+        if len(file_ids):
+            n_files = len(paths)
+            pairs, pair_index = _first_seen(entry_contributor * n_files + file_ids)
+            pair_lines = np.bincount(pair_index, weights=file_lines, minlength=len(pairs)).astype(np.int64)
+            for pair, lines in zip(pairs.tolist(), pair_lines.tolist()):
+                contributor, path = names[pair // n_files], paths[pair % n_files]
+                self.unique_files_per_contributor[contributor].add(path)
+                self.files_per_contributor_with_sizes[contributor][path] += lines
+
+            file_order, file_index = _first_seen(file_ids)
+            all_lines = np.bincount(file_index, weights=file_lines, minlength=len(file_order)).astype(np.int64)
+            for path, lines in zip(file_order.tolist(), all_lines.tolist()):
+                self.all_files_with_sizes[paths[path]] = lines
+
+        human = ~bot_author[author_ids]
+        if human.any():
+            for author in _first_seen(author_ids[human])[0].tolist():
+                username, email, contributor, _ = resolved[author]
+                self.contributor_map[contributor].add((username, email))
+
+            human_entries = ~bot_author[entry_author]
+            if human_entries.any():
+                n_contributors = len(names)
+                pairs, _ = _first_seen(file_ids[human_entries] * n_contributors + entry_contributor[human_entries])
+                for pair in pairs.tolist():
+                    self.file_contributors[paths[pair // n_contributors]].add(names[pair % n_contributors])
@@ -0,0 +1,190 @@
+import json
+import logging
+import os
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, urlparse
+
+from github_client import github_client
+from sqlite_store import SQLiteStore
+
+# Pages of /contributors and user profiles fetched at the same time.
+CONTRIBUTOR_FETCH_WORKERS = int(os.getenv("CONTRIBUTOR_FETCH_WORKERS", "8"))
+# Resolved names/emails are reused across runs for this many seconds.
+IDENTITY_CACHE_PATH = os.path.join(os.getenv("BUSFACTOR_DATA_DIR", "data"), "identities.sqlite3")
+IDENTITY_CACHE_TTL = int(os.getenv("IDENTITY_CACHE_TTL", str(7 * 24 * 3600)))
+
+PAGE_SIZE = 100
+# GitHub caps the number of nodes one GraphQL query may ask for.
+GRAPHQL_BATCH_SIZE = 100
+
+Contributor = namedtuple("Contributor", ["login", "type", "name", "email"])
+
+
+class GraphQLError(Exception):
+    """Raised when GitHub answers a GraphQL query with errors other than unknown users."""
+
+
+class IdentityCache(SQLiteStore):
+    """
+    SQLite cache of GitHub login -> (name, email). Profiles can change, so entries older
+    than `ttl` seconds are fetched again.
+    """
+
+    def __init__(self, path=IDENTITY_CACHE_PATH, ttl=IDENTITY_CACHE_TTL):
+        super().__init__(path)
+        self.ttl = ttl
+
+    def _create_schema(self, connection):
+        connection.execute("""
+            CREATE TABLE IF NOT EXISTS identities (
+                login TEXT PRIMARY KEY,
+                name TEXT,
+                email TEXT,
+                fetched_at INTEGER NOT NULL
+            ) WITHOUT ROWID
+        """)
+
+    def get_many(self, logins):
+        """
+        Returns {login: (name, email)} for the logins with a fresh cache entry.
+        """
+        logins = list(logins)
+        found = {}
+        oldest = int(time.time()) - self.ttl
+        with self._connect() as connection:
+            for start in range(0, len(logins), 500):
+                chunk = logins[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = connection.execute(
+                    f"SELECT login, name, email FROM identities WHERE fetched_at >= ? AND login IN ({placeholders})",
+                    [oldest, *chunk],
+                )
+                for login, name, email in rows:
+                    found[login] = (name, email)
+        return found
+
+    def put_many(self, identities):
+        """
+        Stores {login: (name, email)}.
+        """
+        now = int(time.time())
+        with self._connect() as connection:
+            connection.executemany(
+                "INSERT OR REPLACE INTO identities (login, name, email, fetched_at) VALUES (?, ?, ?, ?)",
+                [(login, name, email, now) for login, (name, email) in identities.items()],
+            )
+
+
+identity_cache = IdentityCache()
+
+
+def _last_page(response):
+    last = response.links.get("last")
+    if not last:
+        return 1
+    return int(parse_qs(urlparse(last["url"]).query)["page"][0])
+
+
+def fetch_contributor_logins(repo_name, send_progress=None, workers=CONTRIBUTOR_FETCH_WORKERS):
+    """
+    Returns [(login, type)] from /repos/{repo}/contributors in GitHub's order. The first
+    page tells how many there are; the remaining pages are fetched concurrently.
+    """
+    path = f"repos/{repo_name}/contributors"
+
+    def fetch_page(page):
+        response = github_client.get(path, params={"per_page": PAGE_SIZE, "page": page})
+        response.raise_for_status()
+        # 204 No Content for an empty repository
+        return response.json() if response.status_code == 200 else []
+
+    first = github_client.get(path, params={"per_page": PAGE_SIZE, "page": 1})
+    first.raise_for_status()
+    pages = [first.json() if first.status_code == 200 else []]
+    last_page = _last_page(first)
+    if last_page > 1:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for page_number, page in enumerate(executor.map(fetch_page, range(2, last_page + 1)), start=2):
+                pages.append(page)
+                if send_progress:
+                    send_progress(f"Fetch all contributors...{page_number * 100 // last_page}%")
+    return [(item["login"], item["type"]) for page in pages for item in page]
+
+
+def _graphql_identities(logins):
+    # Logins can contain characters GraphQL aliases can't, so aliases are positional.
+    query = "query {" + " ".join(
+        f"u{i}: user(login: {json.dumps(login)}) {{ login name email }}" for i, login in enumerate(logins)
+    ) + "}"
+    response = github_client.post("graphql", json={"query": query})
+    response.raise_for_status()
+    body = response.json()
+    data = body.get("data")
+    # Deleted/renamed accounts come back as null with a NOT_FOUND error. Anything else
+    # (RATE_LIMITED, query too complex, ...) comes with a 200 too and says nothing
+    # about the users, so it must not end up in the identity cache.
+    errors = [error for error in body.get("errors") or [] if error.get("type") != "NOT_FOUND"]
+    if data is None or errors:
+        raise GraphQLError("; ".join(error.get("message", str(error)) for error in errors) or "No data returned")
+    identities = {}
+    for i, login in enumerate(logins):
+        # Only the users GitHub answered for
+        if f"u{i}" not in data:
+            continue
+        user = data[f"u{i}"]
+        identities[login] = (user.get("name") or None, user.get("email") or None) if user else (None, None)
+    return identities
+
+
+def _rest_identity(login):
+    response = github_client.get(f"users/{login}")
+    if response.status_code == 404:
+        return login, (None, None)
+    response.raise_for_status()
+    user = response.json()
+    return login, (user.get("name") or None, user.get("email") or None)
+
+
+def resolve_identities(logins, send_progress=None, workers=CONTRIBUTOR_FETCH_WORKERS):
+    """
+    Returns {login: (name, email)}. Cached identities are reused; the others are fetched
+    with one GraphQL query per GRAPHQL_BATCH_SIZE users (GraphQL needs a token, without
+    one the REST profiles are fetched concurrently instead).
+    """
+    logins = list(dict.fromkeys(logins))
+    identities = identity_cache.get_many(logins)
+    missing = [login for login in logins if login not in identities]
+    if not missing:
+        return identities
+
+    fetched = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        if github_client.has_token():
+            batches = [missing[start:start + GRAPHQL_BATCH_SIZE] for start in range(0, len(missing), GRAPHQL_BATCH_SIZE)]
+            for done, batch in enumerate(executor.map(_graphql_identities, batches), start=1):
+                fetched.update(batch)
+                if send_progress:
+                    send_progress(f"Resolve contributor identities...{done * 100 // len(batches)}%")
+        else:
+            fetched.update(executor.map(_rest_identity, missing))
+    logging.info("Resolved %d contributor identities (%d from cache)", len(logins), len(identities))
+    identity_cache.put_many(fetched)
+    identities.update(fetched)
+    return identities
+
+
+def fetch_contributors(repo_name, send_progress=None):
+    """
+    Returns the repository's contributors as Contributor(login, type, name, email), in
+    GitHub's order. Bots are not resolved, as they have no profile name or email.
+    """
+    logins = fetch_contributor_logins(repo_name, send_progress)
+    identities = resolve_identities(
+        (login for login, contributor_type in logins if contributor_type != "Bot"), send_progress
+    )
+    return [
+        Contributor(login, contributor_type, *identities.get(login, (None, None)))
+        for login, contributor_type in logins
+    ]
@@ -0,0 +1,142 @@
+import numpy as np
+from scipy import sparse
+
+
+def incidence_matrix(file_contributors, contributor_index):
+    """
+    Builds the contributor x file incidence matrix A, where A[i, j] = 1 if contributor i
+    touched file j.
+
+    :param file_contributors: Maps each file to the set of contributors that modified it.
+    :param contributor_index: Maps each contributor to its row in the matrix.
+    """
+    rows = []
+    cols = []
+    for j, contributors in enumerate(file_contributors.values()):
+        for contributor in contributors:
+            rows.append(contributor_index[contributor])
+            cols.append(j)
+    data = np.ones(len(rows), dtype=np.int32)
+    return sparse.csr_matrix(
+        (data, (np.asarray(rows, dtype=np.int32), np.asarray(cols, dtype=np.int32))),
+        shape=(len(contributor_index), len(file_contributors)),
+    )
+
+
+def _top_k_per_node(rows, cols, weights, k):
+    """
+    Returns a mask keeping each edge that is among the k heaviest edges of at least one
+    of its endpoints. Ties are broken by edge position, so the result is deterministic.
+    """
+    n_edges = len(weights)
+    endpoints = np.concatenate([rows, cols])
+    edge_ids = np.concatenate([np.arange(n_edges), np.arange(n_edges)])
+    both_weights = np.concatenate([weights, weights])
+
+    # Group the edge endpoints by node, heaviest first, and rank them within each group.
+    order = np.lexsort((-both_weights, endpoints))
+    sorted_endpoints = endpoints[order]
+    group_starts = np.flatnonzero(np.r_[True, sorted_endpoints[1:] != sorted_endpoints[:-1]])
+    group_sizes = np.diff(np.r_[group_starts, len(sorted_endpoints)])
+    rank = np.arange(len(sorted_endpoints)) - np.repeat(group_starts, group_sizes)
+
+    keep = np.zeros(n_edges, dtype=bool)
+    keep[edge_ids[order][rank < k]] = True
+    return keep
+
+
+# Defaults keep every shared file at full weight, i.e. the plain A·Aᵀ counts.
+DEFAULT_EDGE_OPTIONS = {
+    "max_file_contributors": None,
+    "hub_weighting": "none",
+    "min_edge_weight": None,
+    "top_k_edges": None,
+}
+
+
+HUB_WEIGHTINGS = ("none", "inverse")
+
+
+def edge_options_with_defaults(edge_options):
+    """
+    Merges user-supplied edge options over DEFAULT_EDGE_OPTIONS. Raises ValueError for
+    unknown keys and for values of the wrong type or out of range.
+    """
+    edge_options = edge_options or {}
+    if not isinstance(edge_options, dict):
+        raise ValueError("Edge options must be an object")
+    unknown = set(edge_options) - set(DEFAULT_EDGE_OPTIONS)
+    if unknown:
+        raise ValueError(f"Unknown edge options: {', '.join(sorted(unknown))}")
+    options = {**DEFAULT_EDGE_OPTIONS, **edge_options}
+
+    for name in ("max_file_contributors", "top_k_edges"):
+        value = options[name]
+        # bool is an int subclass, but true/false is not a count
+        if value is not None and (not isinstance(value, int) or isinstance(value, bool) or value < 1):
+            raise ValueError(f"{name} must be an integer of at least 1 or null")
+    if options["hub_weighting"] not in HUB_WEIGHTINGS:
+        raise ValueError(f"hub_weighting must be one of: {', '.join(HUB_WEIGHTINGS)}")
+    value = options["min_edge_weight"]
+    if value is not None and (not isinstance(value, (int, float)) or isinstance(value, bool)
+                              or not value >= 0 or value == float("inf")):
+        raise ValueError("min_edge_weight must be a number of at least 0 or null")
+    return options
+
+
+def co_authorship_edges(file_contributors, unique_contributors, max_file_contributors=None,
+                        hub_weighting="none", min_edge_weight=None, top_k_edges=None):
+    """
+    Returns the weighted collaboration edges as a list of (contributor_1, contributor_2,
+    weight) tuples, where weight is the number of files both contributors modified.
+
+    The weighted adjacency is A·Aᵀ of the incidence matrix, computed in sparse form
+    instead of enumerating every contributor pair of every file in Python.
+
+    :param unique_contributors: Maps normalized usernames (as used in file_contributors)
+                                to the representative name used as the graph node.
+    :param max_file_contributors: Files modified by more contributors than this are
+                                  ignored (hub files such as changelogs and lock files).
+    :param hub_weighting: "none" counts every shared file as 1; "inverse" counts a file
+                          with k contributors as 1/(k-1), so hub files add little weight.
+    :param min_edge_weight: Edges lighter than this are dropped.
+    :param top_k_edges: Keep only edges that are among the top_k heaviest of at least
+                        one of their endpoints.
+    """
+    if hub_weighting not in HUB_WEIGHTINGS:
+        raise ValueError(f"Unknown hub weighting: {hub_weighting}")
+
+    contributors = list(unique_contributors)
+    contributor_index = {contributor: i for i, contributor in enumerate(contributors)}
+    incidence = incidence_matrix(file_contributors, contributor_index)
+
+    # Hub files are damped or dropped on the incidence matrix, before the product, so
+    # they never materialise as a dense block of pairs.
+    contributors_per_file = np.asarray(incidence.sum(axis=0)).ravel()
+    if max_file_contributors is not None:
+        incidence = incidence[:, contributors_per_file <= max_file_contributors]
+        contributors_per_file = contributors_per_file[contributors_per_file <= max_file_contributors]
+    weighted_incidence = incidence
+    if hub_weighting == "inverse":
+        file_weights = 1.0 / np.maximum(contributors_per_file - 1, 1)
+        weighted_incidence = incidence @ sparse.diags(file_weights)
+
+    # Only the strict upper triangle is kept: the diagonal counts a contributor's own
+    # files and the lower triangle mirrors the upper one.
+    shared_files = sparse.triu(weighted_incidence @ incidence.T, k=1).tocoo()
+    rows, cols, weights = shared_files.row, shared_files.col, shared_files.data
+
+    if min_edge_weight is not None:
+        keep = weights >= min_edge_weight
+        rows, cols, weights = rows[keep], cols[keep], weights[keep]
+    if top_k_edges is not None and len(weights):
+        keep = _top_k_per_node(rows, cols, weights, top_k_edges)
+        rows, cols, weights = rows[keep], cols[keep], weights[keep]
+
+    representatives = [unique_contributors[contributor] for contributor in contributors]
+    if hub_weighting == "none":
+        weights = weights.astype(np.int64)
+    return [
+        (representatives[i], representatives[j], weight)
+        for i, j, weight in zip(rows.tolist(), cols.tolist(), weights.tolist())
+    ]
@@ -0,0 +1,143 @@
+"""
+Paginated views over the file-level data of a stored analysis.
+
+The graph set keeps four per-file maps (unique_files_per_contributor,
+all_files_with_sizes, filtered_unique_files, files_per_contributor_with_percentages)
+that grow with the size of the repository. /generate_graphs jobs answer with a summary
+without them, and clients page through them on demand from the result cache by the
+summary's `analysis_id`.
+"""
+import re
+
+from identity import normalize_name
+from result_cache import result_cache
+
+FILE_DETAIL_KEYS = (
+    "unique_files_per_contributor",
+    "all_files_with_sizes",
+    "filtered_unique_files",
+    "files_per_contributor_with_percentages",
+)
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# Analysis ids are result cache keys (hex digests); anything else never reaches the disk
+_ANALYSIS_ID = re.compile(r"^[0-9a-f]{32,64}$")
+
+
+class UnknownAnalysis(LookupError):
+    pass
+
+
+def load_analysis(analysis_id):
+    """
+    Returns the stored graph set for `analysis_id`, or raises UnknownAnalysis.
+    """
+    graphs = result_cache.get(analysis_id) if _ANALYSIS_ID.match(analysis_id or "") else None
+    if graphs is None:
+        raise UnknownAnalysis(f"Unknown analysis: {analysis_id}")
+    return graphs
+
+
+def summary(graphs):
+    """
+    The graph set without its file-level maps, with the number of entries in each.
+    """
+    result = {key: value for key, value in graphs.items() if key not in FILE_DETAIL_KEYS}
+    result["file_details"] = {key: len(graphs.get(key) or ()) for key in FILE_DETAIL_KEYS}
+    return result
+
+
+def _int_arg(args, name, default, minimum, maximum=None):
+    value = args.get(name)
+    if value in (None, ""):
+        return default
+    try:
+        value = int(value)
+    except ValueError:
+        raise ValueError(f"'{name}' must be an integer")
+    if value < minimum:
+        raise ValueError(f"'{name}' must be at least {minimum}")
+    return min(value, maximum) if maximum is not None else value
+
+
+def _page(rows, args, sort_key):
+    """
+    Applies prefix, top and page/per_page from the query `args` to `rows` (dicts with
+    a "path"). Rows are ordered by path, or by `sort_key` descending when top is given.
+    """
+    prefix = args.get("prefix") or ""
+    top = _int_arg(args, "top", None, 1)
+    page = _int_arg(args, "page", 1, 1)
+    per_page = _int_arg(args, "per_page", DEFAULT_PAGE_SIZE, 1, MAX_PAGE_SIZE)
+
+    if prefix:
+        rows = [row for row in rows if row["path"].startswith(prefix)]
+    rows.sort(key=lambda row: row["path"])
+    if top is not None:
+        # stable: ties stay in path order
+        rows.sort(key=sort_key, reverse=True)
+        rows = rows[:top]
+
+    start = (page - 1) * per_page
+    return {
+        "page": page,
+        "per_page": per_page,
+        "total": len(rows),
+        "items": rows[start:start + per_page],
+    }
+
+
+def file_page(graphs, args):
+    """
+    Files of the whole analysis with the lines changed in each; `top` keeps the N most
+    changed files.
+    """
+    rows = [{"path": path, "lines_changed": lines} for path, lines in (graphs.get("all_files_with_sizes") or {}).items()]
+    return _page(rows, args, lambda row: row["lines_changed"])
+
+
+def _by_normalized_name(mapping, name):
+    # Key developer maps are keyed by graph node id, the rest by normalised username
+    for node, value in (mapping or {}).items():
+        if normalize_name(node) == name:
+            return value
+    return {}
+
+
+def contributor_file_page(graphs, contributor, args):
+    """
+    Files touched by `contributor` (graph node id or normalised username), with their
+    share of each file's changes and, for key developers, the file's current line
+    count; `top` keeps the N files with the highest share.
+    """
+    name = normalize_name(contributor)
+    files = (graphs.get("unique_files_per_contributor") or {}).get(name)
+    if files is None:
+        raise UnknownAnalysis(f"Unknown contributor: {contributor}")
+    percentages = _by_normalized_name(graphs.get("files_per_contributor_with_percentages"), name)
+    sizes = _by_normalized_name(graphs.get("filtered_unique_files"), name)
+    rows = [
+        {"path": path, "percentage": percentages.get(path), "lines": sizes.get(path)}
+        for path in files
+    ]
+    return _page(rows, args, lambda row: row["percentage"] or 0)
+
+
+def contributor_page(graphs, args):
+    """
+    Contributors with the number of files they touched and their LOC, most files first.
+    """
+    page = _int_arg(args, "page", 1, 1)
+    per_page = _int_arg(args, "per_page", DEFAULT_PAGE_SIZE, 1, MAX_PAGE_SIZE)
+    loc = graphs.get("loc_per_contributor") or {}
+    key_developers = {normalize_name(node) for node in graphs.get("filtered_unique_files") or {}}
+    rows = sorted(
+        (
+            {"name": name, "files": len(files), "loc": loc.get(name, 0), "key_developer": name in key_developers}
+            for name, files in (graphs.get("unique_files_per_contributor") or {}).items()
+        ),
+        key=lambda row: (-row["files"], row["name"]),
+    )
+    start = (page - 1) * per_page
+    return {"page": page, "per_page": per_page, "total": len(rows), "items": rows[start:start + per_page]}
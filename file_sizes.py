@@ -0,0 +1,139 @@
+import logging
+import subprocess
+import threading
+
+# Blobs are streamed in chunks so large files never sit in memory as a whole.
+CHUNK_SIZE = 64 * 1024
+# Same heuristic git uses: a NUL byte in the first 8000 bytes means binary.
+BINARY_PROBE_SIZE = 8000
+MAX_MEMOISED_BLOBS = 200_000
+
+# (repo, blob sha) -> line count, or None for binary/missing blobs. Blobs are immutable,
+# so an entry never goes stale.
+_line_counts = {}
+_line_counts_lock = threading.Lock()
+
+
+def tree_blobs(git_dir, rev="HEAD"):
+    """
+    Walks the tree of `rev` once and returns {path: blob sha} for every file in it.
+    """
+    output = subprocess.run(
+        ["git", "--git-dir", git_dir, "ls-tree", "-r", "-z", "--full-tree", rev],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        check=True,
+    ).stdout
+    blobs = {}
+    for entry in output.split(b"\0"):
+        if not entry:
+            continue
+        info, path = entry.split(b"\t", 1)
+        _, object_type, sha = info.split(b" ")
+        if object_type == b"blob":
+            blobs[path.decode("utf-8", errors="replace")] = sha.decode("ascii")
+    return blobs
+
+
+class BlobReader:
+    """
+    A long-lived `git cat-file --batch` process that streams blob contents by SHA.
+    """
+
+    def __init__(self, git_dir):
+        self.process = subprocess.Popen(
+            ["git", "--git-dir", git_dir, "cat-file", "--batch"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+        )
+
+    def count_lines(self, sha):
+        """
+        Returns the number of lines of the blob (newlines + 1, as before), or None if the
+        blob is binary or missing.
+        """
+        self.process.stdin.write(sha.encode("ascii") + b"\n")
+        self.process.stdin.flush()
+        line = self.process.stdout.readline()
+        if not line:
+            self._fail(sha)
+        header = line.split()
+        if len(header) != 3:
+            # "<sha> missing"
+            return None
+        remaining = int(header[2])
+
+        newlines = 0
+        binary = False
+        first_chunk = True
+        while remaining:
+            chunk = self.process.stdout.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                # EOF before the whole blob arrived: cat-file died
+                self._fail(sha)
+            remaining -= len(chunk)
+            if first_chunk and b"\0" in chunk[:BINARY_PROBE_SIZE]:
+                binary = True
+            first_chunk = False
+            # Keep draining a binary blob so the stream stays in sync, but skip counting.
+            if not binary:
+                newlines += chunk.count(b"\n")
+        self.process.stdout.read(1)  # trailing newline after the content
+        return None if binary else newlines + 1
+
+    def _fail(self, sha):
+        # The stream is out of sync for good; kill the process so close() can't block
+        self.process.kill()
+        raise RuntimeError(f"git cat-file --batch exited while reading blob {sha} "
+                           f"(exit status {self.process.wait()})")
+
+    def close(self):
+        self.process.stdin.close()
+        self.process.stdout.close()
+        self.process.wait()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def file_line_counts(git_dir, paths, rev="HEAD", check=None):
+    """
+    Returns {path: line count} for `paths` as they are in `rev`. Binary files and paths
+    that no longer exist map to None. Each blob is read at most once per repository,
+    across calls.
+
+    :param check: Optional callable run before each blob is read (e.g. JobContext.check).
+    """
+    blobs = tree_blobs(git_dir, rev)
+    line_counts = {}
+    to_read = {}
+    missing = 0
+    with _line_counts_lock:
+        for path in paths:
+            sha = blobs.get(path)
+            if sha is None:
+                line_counts[path] = None
+                missing += 1
+            elif (git_dir, sha) in _line_counts:
+                line_counts[path] = _line_counts[(git_dir, sha)]
+            else:
+                to_read.setdefault(sha, []).append(path)
+    if missing:
+        logging.warning("%d files are not in %s and have no size", missing, rev)
+
+    if to_read:
+        with BlobReader(git_dir) as reader:
+            for sha, sha_paths in to_read.items():
+                if check is not None:
+                    check()
+                lines = reader.count_lines(sha)
+                for path in sha_paths:
+                    line_counts[path] = lines
+                with _line_counts_lock:
+                    if len(_line_counts) >= MAX_MEMOISED_BLOBS:
+                        _line_counts.pop(next(iter(_line_counts)))
+                    _line_counts[(git_dir, sha)] = lines
+    return line_counts
@@ -3,10 +3,8 @@ import math
 import networkx as nx
 import tempfile
 import shutil
-import re
 from collections import defaultdict
-from datetime import datetime, timedelta
-from github import Github
+from datetime import datetime, timedelta, timezone
 import numpy as np
 import community as community_louvain  # For community detection (pip install python-louvain)
 from networkx.algorithms import community as nx_community
@@ -18,7 +16,19 @@ import requests
 import logging
 import random
 
-from graph_to_json import graph_to_json
+from graph_to_json import graph_views
+from commit_miner import HISTORY_WINDOW_DAYS, has_commit, history_window, list_commits, shallow_boundary
+from commit_store import commit_store
+from commit_table import CommitAggregates
+from shard_miner import load_commit_table, mine_commits
+from contributors import fetch_contributors
+from scoring import score_contributors
+from file_sizes import file_line_counts
+from identity import IdentityResolver, normalize_name
+from edge_builder import co_authorship_edges, edge_options_with_defaults
+from mirror_store import directory_size, mirror_store
+from jobs import JobContext
+from result_cache import make_cache_key, remote_head, result_cache
 
 # --- Set Up Logging ---
 logging.basicConfig(
@@ -30,6 +40,16 @@ logging.basicConfig(
     ]
 )
 
+# Weights of the custom centrality score and the share of the total score that the
+# key developers must cover.
+CENTRALITY_WEIGHTS = {
+    "loc": 0.5,
+    "files": 0.5,
+    "jira": 0.2,
+    "jira_only": 0.1,
+    "key_developer_threshold": 0.3,
+}
+
 # --- Jira Integration Helper Functions ---
 
 # Original function . 
@@ -401,8 +421,7 @@ def calculate_jira_activity(issues):
     """
     jira_activity = defaultdict(int)
 
-    def normalize(name):
-        return re.sub(r"[^a-zA-Z0-9]", "", name).lower()
+    normalize = normalize_name
 
     for issue in issues:
         fields = issue.get("fields", {})
@@ -425,21 +444,17 @@ def calculate_jira_activity(issues):
     return jira_activity
 
 
-def add_file_sizes(repo, filtered_unique_files):
-    file_sizes = {}
+def add_file_sizes(repo, filtered_unique_files, job=None, rev="HEAD"):
+    # HEAD's tree is walked once and each distinct blob is streamed through a single
+    # `git cat-file --batch`, so files shared by key developers are read exactly once.
+    all_files = set()
+    for files in filtered_unique_files.values():
+        all_files.update(files)
+    line_counts = file_line_counts(repo.git_dir, all_files, rev=rev, check=job.check if job else None)
 
+    file_sizes = {}
     for contributor, files in filtered_unique_files.items():
-        contributor_files = {}
-        for file in files:
-            try:
-                file_blob = repo.tree()[file]
-                content = file_blob.data_stream.read().decode("utf-8")
-                loc = content.count("\n") + 1  # Count lines
-                contributor_files[file] = loc
-            except Exception as e:
-                logging.error("Error processing file %s: %s", file, e)
-                contributor_files[file] = None
-        file_sizes[contributor] = contributor_files
+        file_sizes[contributor] = {file: line_counts[file] for file in files}
 
     return file_sizes
 
@@ -454,8 +469,23 @@ def calculate_contribution_percentages(all_files_with_sizes, files_per_contribut
             files_per_contributor_with_sizes[contributor][file_path] = round(contribution_percentage, 2)
 
 
-def generateGraphSet(repo_url, send_progress):
+def generateGraphSet(repo_url, send_progress, clone_strategy="full", edge_options=None, job=None):
+    graphs, _ = _generate_graph_set_at(repo_url, send_progress, clone_strategy, edge_options, job)
+    return graphs
+
 
+def _generate_graph_set_at(repo_url, send_progress, clone_strategy="full", edge_options=None, job=None,
+                           head_sha=None):
+    """
+    Analyses commit `head_sha` (a SHA the caller resolved earlier, e.g. for the result
+    cache key) or, without one, the mirror's HEAD after the fetch. Returns the graph set
+    and the SHA analysed, which is the mirror's HEAD if `head_sha` is gone (force-push).
+    """
+    # Validate edge options before any clone work (see edge_builder.DEFAULT_EDGE_OPTIONS)
+    edge_options = edge_options_with_defaults(edge_options)
+    # Cancellation and resource budgets are checked at each stage boundary
+    job = job or JobContext()
+    job.start()
 
     # Extract repository name from URL
     repo_name = repo_url.split("/")[-2] + "/" + repo_url.split("/")[-1].replace(".git", "")
@@ -466,242 +496,228 @@ def generateGraphSet(repo_url, send_progress):
         logging.error("GitHub token not found. Ensure it's set as an environment variable.")
 
     load_dotenv()
-    g = Github(GITHUB_TOKEN)
 
+    # Reuse the persistent bare mirror of this repository, fetching only what changed.
     send_progress("Cloning repository...")
-    temp_dir = tempfile.mkdtemp()
-    auth_repo_url = repo_url.replace("https://", f"https://{GITHUB_TOKEN}@")
-    repo = git.Repo.clone_from(auth_repo_url, temp_dir, bare=True)
-    send_progress("Repository cloned!")
-
-    github_repo = g.get_repo(repo_name)
-    contributor_data = {}
-    email_to_username = {}
-    name_to_username = {}
-
-    send_progress("Fetch all contributors for the project...")
-    contributors = github_repo.get_contributors()
-    contributors_list = list(contributors)
-    i = 0
-    tot = len(contributors_list)
-    for contributor in contributors:
-        i += 1
-        percentage = math.ceil((i / tot) * 100)
-        send_progress(f"Fetch all contributors...{percentage}%")
-        username = contributor.login
-        contributor_data[username] = {
-            "type": contributor.type,
-            "normalized_name": re.sub(r"[^a-zA-Z0-9]", "", username).lower(),
-        }
-        if contributor.email:
-            email_to_username[contributor.email] = username
-        elif contributor.name:
-            name_to_username[contributor.name] = username
-
-    def get_normalized_username(username):
-        return re.sub(r"[^a-zA-Z0-9]", "", username).lower()
-
-    def is_bot(username):
-        user_info = contributor_data.get(username)
-        if user_info and user_info["type"] == "Bot":
-            return True
-        if "bot" in username.lower():
-            return True
-        return False
-
-    most_recent_commit = next(repo.iter_commits())
-    cutoff_date = most_recent_commit.committed_datetime - timedelta(days=547)
-
-    send_progress("Calculate LOC and file diversity...")
-    commits_data = []
-    loc_per_contributor = defaultdict(int)
-    unique_files_per_contributor = defaultdict(set)
-    files_per_contributor_with_sizes = defaultdict(lambda: defaultdict(int))
-    all_files_with_sizes = {}
-    commits_list = list(repo.iter_commits())
-    tot = len(commits_list)
-    j = 0
-    for commit in commits_list:
-        j += 1
-        percentage = math.ceil((j / tot) * 100)
-        send_progress(f"Calculate LOC and file diversity...{percentage}%")
-        if commit.committed_datetime < cutoff_date:
-            break
-
-        author_username = (email_to_username.get(commit.author.email)
-                           or name_to_username.get(commit.author.name)
-                           or commit.author.name)
-        normalized_username = get_normalized_username(author_username)
-        total_lines_changed = commit.stats.total["insertions"] + commit.stats.total["deletions"]
-        loc_per_contributor[normalized_username] += total_lines_changed
-        unique_files_per_contributor[normalized_username].update(commit.stats.files.keys())
-        for file_path, file_stats in commit.stats.files.items():
-            file_size = file_stats.get("lines", 0)
-            all_files_with_sizes[file_path] = all_files_with_sizes.get(file_path, 0) + file_size
-            files_per_contributor_with_sizes[normalized_username][file_path] += file_size
-        commits_data.append({
-            "datetime": commit.committed_datetime,
-            "author_name": author_username,
-            "author_email": commit.author.email,
-            "files": list(commit.stats.files.keys()),
-        })
-
-    send_progress("Generating graphs")
-    G = nx.Graph()
-    contributor_map = defaultdict(set)
-    file_contributors = defaultdict(set)
-
-    send_progress("Processing commits...")
-    for commit in commits_data:
-        username = commit["author_name"]
-        if is_bot(username):
-            continue
-        normalized_username = get_normalized_username(username)
-        contributor_map[normalized_username].add((username, commit["author_email"]))
-        for file in commit["files"]:
-            file_contributors[file].add(normalized_username)
-
-    send_progress("Creating graph nodes for each unique contributor group...")
-    unique_contributors = {}
-    for norm_name, variations in contributor_map.items():
-        representative = next(iter(variations))[0]
-        unique_contributors[norm_name] = representative
-        G.add_node(representative)
-
-    send_progress("Adding edges based on shared file contributions...")
-    for file, contributors in file_contributors.items():
-        contributors_list = list(contributors)
-        for i in range(len(contributors_list)):
-            for j in range(i + 1, len(contributors_list)):
-                contributor_1 = unique_contributors[contributors_list[i]]
-                contributor_2 = unique_contributors[contributors_list[j]]
-                if G.has_edge(contributor_1, contributor_2):
-                    G[contributor_1][contributor_2]["weight"] += 1
-                else:
-                    G.add_edge(contributor_1, contributor_2, weight=1)
-
-    send_progress("Calculating custom centrality scores for each contributor...")
-    custom_centrality = {}
-    degree_centrality = nx.degree_centrality(G)
-    for contributor in G.nodes():
-        norm_name = get_normalized_username(contributor)
-        total_loc = loc_per_contributor[norm_name]
-        file_count = len(unique_files_per_contributor[norm_name])
-        custom_centrality[contributor] = (
-            degree_centrality[contributor]
-            + (0.5 * total_loc / max(loc_per_contributor.values()))
-            + (0.5 * file_count / max(len(files) for files in unique_files_per_contributor.values()))
+    # The disk budget is also checked while git is still writing the mirror
+    job.check("clone")
+    # The mirror isn't locked during the analysis: everything below reads the HEAD it had
+    # right after the fetch, so a concurrent fetch doesn't change what is analysed.
+    mirror = mirror_store.acquire(repo_name, repo_url, strategy=clone_strategy, check=job.check_disk)
+    mirror_dir = mirror.path
+    repo = None
+
+    try:
+        # Inside the try, so the mirror is released even if this fails
+        repo = git.Repo(mirror_dir)
+        send_progress("Repository cloned!")
+        job.check("clone")
+        head = mirror.head
+        if head_sha and head_sha != head:
+            # Something was pushed since the caller looked HEAD up
+            if has_commit(repo.git_dir, head_sha):
+                head = head_sha
+            else:
+                logging.warning("%s is no longer in %s, analysing %s", head_sha, repo_name, head)
+        job.check_disk(directory_size(mirror_dir))
+
+
+        contributor_data = {}
+        email_to_username = {}
+        name_to_username = {}
+
+        send_progress("Fetch all contributors for the project...")
+        # Pages are fetched concurrently and names/emails resolved in GraphQL batches,
+        # instead of one lazy profile request per contributor.
+        for contributor in fetch_contributors(repo_name, send_progress):
+            username = contributor.login
+            contributor_data[username] = {
+                "type": contributor.type,
+                "normalized_name": normalize_name(username),
+            }
+            if contributor.email:
+                email_to_username[contributor.email] = username
+            elif contributor.name:
+                name_to_username[contributor.name] = username
+        job.check("contributors")
+
+        get_normalized_username = normalize_name
+
+        def is_bot(username):
+            user_info = contributor_data.get(username)
+            if user_info and user_info["type"] == "Bot":
+                return True
+            if "bot" in username.lower():
+                return True
+            return False
+
+        # Ask git for the newest commit date and the size of the 1.5 year window up front,
+        # so only commits inside the window are ever listed.
+        _, cutoff_timestamp, window_commits = history_window(repo.git_dir, rev=head)
+
+        # Only commits missing from the commit-stats store are mined; everything else in
+        # the window is read back from the store.
+        window_shas = [sha for sha, _ in list_commits(repo.git_dir, rev=head, since=cutoff_timestamp, max_count=window_commits)]
+        job.check_commits(len(window_shas))
+        # Records mined at another clone's shallow boundary are mined again (see CommitStore)
+        new_shas = commit_store.missing_shas(repo_name, window_shas, boundary_shas=shallow_boundary(repo.git_dir))
+        if new_shas:
+            send_progress(f"Mining {len(new_shas)} new commits...")
+            # Sharded over the mining process pool (see shard_miner.MINING_WORKERS)
+            mine_commits(
+                repo_name, repo.git_dir, new_shas, check=lambda: job.check("commit mining"),
+                on_done=lambda done, total: send_progress(f"Mining {len(new_shas)} new commits...{done * 100 // total}%"),
+            )
+
+        # The window is held as an interned, columnar table (see commit_table.py)
+        send_progress("Calculate LOC and file diversity...")
+        commit_table = load_commit_table(
+            repo_name, window_shas, check=lambda: job.check("commit aggregation"),
+            on_done=lambda done, total: send_progress(f"Calculate LOC and file diversity...{done * 100 // total}%"),
         )
 
-    # --- Jira Integration ---
-    send_progress("Fetching Jira issues...")
-    # Using environment variables from your test sample
-    jira_server = os.getenv("JIRA_SERVER")
-    jira_project_key = os.getenv("JIRA_PROJECT_KEY")
-    jira_email = os.getenv("JIRA_EMAIL")
-    jira_api_token = os.getenv("JIRA_API_TOKEN")
-    jira_auth = (jira_email, jira_api_token)
+        # Each distinct author is resolved once (.mailmap, GitHub login, fuzzy aliases)
+        send_progress("Resolving contributor identities...")
+        identities = IdentityResolver(email_to_username, name_to_username, is_bot)
+        identities.resolve_all(commit_table.author_counts(), repo.git_dir)
+        authors = {}
+        for name, email in commit_table.authors.values:
+            username, canonical_email = identities.resolve(name, email)
+            authors[(name, email)] = (username, canonical_email, get_normalized_username(username), is_bot(username))
+
+        aggregates = CommitAggregates(commit_table, authors)
+        job.check("commit aggregation")
+        loc_per_contributor = aggregates.loc_per_contributor
+        unique_files_per_contributor = aggregates.unique_files_per_contributor
+        files_per_contributor_with_sizes = aggregates.files_per_contributor_with_sizes
+        all_files_with_sizes = aggregates.all_files_with_sizes
+        contributor_map = aggregates.contributor_map
+        file_contributors = aggregates.file_contributors
+
+        send_progress("Generating graphs")
+        G = nx.Graph()
+
+        send_progress("Creating graph nodes for each unique contributor group...")
+        unique_contributors = {}
+        for norm_name, variations in contributor_map.items():
+            representative = next(iter(variations))[0]
+            unique_contributors[norm_name] = representative
+            G.add_node(representative)
+
+        send_progress("Adding edges based on shared file contributions...")
+        job.check("edge building")
+        edges = co_authorship_edges(file_contributors, unique_contributors, **edge_options)
+        job.check_edges(len(edges))
+        G.add_weighted_edges_from(edges)
+
+        # --- Jira Integration ---
+        send_progress("Fetching Jira issues...")
+        # Using environment variables from your test sample
+        jira_server = os.getenv("JIRA_SERVER")
+        jira_project_key = os.getenv("JIRA_PROJECT_KEY")
+        jira_email = os.getenv("JIRA_EMAIL")
+        jira_api_token = os.getenv("JIRA_API_TOKEN")
+        jira_auth = (jira_email, jira_api_token)
     
-    try:
-        issues = fetch_jira_issues(jira_server, jira_project_key, jira_auth)
-        jira_activity = calculate_jira_activity(issues)
-        send_progress("Jira data fetched and processed!")
-    except Exception as e:
-        send_progress(f"Error fetching Jira data: {e}")
-        logging.error("Error fetching Jira data: %s", e)
-        jira_activity = {}
-
-    # Define separate weights
-    jira_weight = 0.2       # for GitHub contributors that have Jira activity
-    jira_only_weight = 0.1  # for contributors that exist only in Jira
-
-    # Update centrality for GitHub contributors (nodes already in the graph)
-    for contributor in G.nodes():
-        norm_name = get_normalized_username(contributor)
-        jira_score = jira_activity.get(norm_name, 0)
-        custom_centrality[contributor] += jira_weight * jira_score
-        logging.info("Contributor: %s | Normalized: %s | Jira Score: %d | Updated Centrality: %.2f",
-                     contributor, norm_name, jira_score, custom_centrality[contributor])
-
-    # Now add Jira-only contributors as new nodes
-    for jira_contrib, score in jira_activity.items():
-        # Check if there's any node in G whose normalized name matches jira_contrib
-        exists = False
-        for node in G.nodes():
-            if get_normalized_username(node) == jira_contrib:
-                exists = True
-                break
-        if not exists:
-            # Add this jira-only contributor as a new node.
-            # Here, we use the normalized name as the node label;
-            new_node = jira_contrib
+        try:
+            issues = fetch_jira_issues(jira_server, jira_project_key, jira_auth)
+            jira_activity = calculate_jira_activity(issues)
+            send_progress("Jira data fetched and processed!")
+        except Exception as e:
+            send_progress(f"Error fetching Jira data: {e}")
+            logging.error("Error fetching Jira data: %s", e)
+            jira_activity = {}
+
+        # Degree centrality, normalised LOC and file diversity, Jira activity and the
+        # key developer cut are computed in one vectorised pass (see scoring.py).
+        send_progress("Calculating custom centrality scores for each contributor...")
+        custom_centrality, top_k_nodes, jira_only_nodes = score_contributors(
+            G, loc_per_contributor, unique_files_per_contributor, jira_activity,
+            get_normalized_username, CENTRALITY_WEIGHTS,
+        )
+
+        # Add Jira-only contributors as new nodes, labelled with their normalized name
+        for new_node in jira_only_nodes:
             G.add_node(new_node, jira_only=True)
-            custom_centrality[new_node] = jira_only_weight * score
-            logging.info("Added JIRA-only node: %s | Jira Score: %d | Custom Centrality: %.2f",
-                         new_node, score, custom_centrality[new_node])
-
-    # Determine key contributors (Key Developers)
-    sorted_nodes = sorted(custom_centrality.items(), key=lambda item: item[1], reverse=True)
-    threshold_percentage = 0.3
-    total_centrality_sum = sum(custom_centrality.values())
-    cumulative_sum = 0
-    top_k_nodes = []
-    for node, centrality_value in sorted_nodes:
-        cumulative_sum += centrality_value
-        top_k_nodes.append(node)
-        if cumulative_sum >= threshold_percentage * total_centrality_sum:
-            break
-
-    send_progress("Graphs ready!")
-    full_network_data = graph_to_json(G, custom_centrality)
-    for node in G.nodes():
-        if node in top_k_nodes:
-            G.nodes[node]["class"] = 1
-        else:
-            G.nodes[node]["class"] = 2
-
-    key_collab_data = graph_to_json(G, custom_centrality)
-    calculate_contribution_percentages(all_files_with_sizes, files_per_contributor_with_sizes)
-    unique_files_per_contributor = {key: list(value) for key, value in unique_files_per_contributor.items()}
-    files_per_contributor_with_sizes = {contributor: dict(files) for contributor, files in files_per_contributor_with_sizes.items()}
-    loc_per_contributor = dict(loc_per_contributor)
-    filtered_unique_files = {
-        node: unique_files_per_contributor[get_normalized_username(node)]
-        for node in top_k_nodes
-        if get_normalized_username(node) in unique_files_per_contributor
-    }
-    filtered_unique_files_with_file_sizes = add_file_sizes(repo, filtered_unique_files)
-    files_per_contributor_with_sizes = {
-        node: files_per_contributor_with_sizes.get(get_normalized_username(node), {})
-        for node in top_k_nodes
-        if get_normalized_username(node) in files_per_contributor_with_sizes
-    }
+        logging.info("Scored %d contributors (%d Jira-only), %d key developers",
+                     len(custom_centrality), len(jira_only_nodes), len(top_k_nodes))
+
+        send_progress("Graphs ready!")
+        # One pass builds both views; they share the edge list
+        full_network_data, key_collab_data = graph_views(G, custom_centrality, set(top_k_nodes))
+        calculate_contribution_percentages(all_files_with_sizes, files_per_contributor_with_sizes)
+        unique_files_per_contributor = {key: list(value) for key, value in unique_files_per_contributor.items()}
+        files_per_contributor_with_sizes = {contributor: dict(files) for contributor, files in files_per_contributor_with_sizes.items()}
+        loc_per_contributor = dict(loc_per_contributor)
+        filtered_unique_files = {
+            node: unique_files_per_contributor[get_normalized_username(node)]
+            for node in top_k_nodes
+            if get_normalized_username(node) in unique_files_per_contributor
+        }
+        job.check("file sizing")
+        filtered_unique_files_with_file_sizes = add_file_sizes(repo, filtered_unique_files, job, rev=head)
+        files_per_contributor_with_sizes = {
+            node: files_per_contributor_with_sizes.get(get_normalized_username(node), {})
+            for node in top_k_nodes
+            if get_normalized_username(node) in files_per_contributor_with_sizes
+        }
 
-    graphs = {
-        "network_graph": full_network_data,
-        "key_collab": key_collab_data,
-        "unique_files_per_contributor": unique_files_per_contributor,
-        "loc_per_contributor": loc_per_contributor,
-        "filtered_unique_files": filtered_unique_files_with_file_sizes,
-        "all_files_with_sizes": all_files_with_sizes,
-        "files_per_contributor_with_percentages": files_per_contributor_with_sizes,
-    }
+        graphs = {
+            "network_graph": full_network_data,
+            "key_collab": key_collab_data,
+            "unique_files_per_contributor": unique_files_per_contributor,
+            "loc_per_contributor": loc_per_contributor,
+            "filtered_unique_files": filtered_unique_files_with_file_sizes,
+            "all_files_with_sizes": all_files_with_sizes,
+            "files_per_contributor_with_percentages": files_per_contributor_with_sizes,
+        }
 
-    logging.info("Unique files per contributor: %s", unique_files_per_contributor)
-    logging.info("Files per contributor (with percentages): %s", files_per_contributor_with_sizes)
-    logging.info("All files with sizes: %s", all_files_with_sizes)
+        # Multi-megabyte on large repositories, so only at debug level
+        logging.debug("Unique files per contributor: %s", unique_files_per_contributor)
+        logging.debug("Files per contributor (with percentages): %s", files_per_contributor_with_sizes)
+        logging.debug("All files with sizes: %s", all_files_with_sizes)
 
-    repo.close()
-    repo = None
+        return graphs, head
+    finally:
+        if repo is not None:
+            repo.close()
+            repo = None
+        mirror_store.release(repo_name, clone_strategy)
 
-    def remove_readonly(func, path, _):
-        os.chmod(path, 0o777)
-        func(path)
 
+def generate_graph_set(repo_url, send_progress, clone_strategy="full", edge_options=None, job=None):
+    """
+    Returns the graph set for `repo_url`, served from the result cache when the
+    repository's HEAD and the analysis parameters match an earlier run.
+    """
+    repo_name = repo_url.split("/")[-2] + "/" + repo_url.split("/")[-1].replace(".git", "")
+    # A cheap ls-remote tells us whether anything changed before we clone or fetch.
     try:
-        shutil.rmtree(temp_dir, onerror=remove_readonly)
-    except PermissionError:
-        time.sleep(0.5)
-        shutil.rmtree(temp_dir, onerror=remove_readonly)
-
+        head_sha = remote_head(repo_url)
+    except Exception as e:
+        logging.error("Could not resolve HEAD of %s, skipping the result cache: %s", repo_name, e)
+        head_sha = None
+
+    parameters = {
+        "window_days": HISTORY_WINDOW_DAYS,
+        "weights": CENTRALITY_WEIGHTS,
+        "jira_project": os.getenv("JIRA_PROJECT_KEY"),
+        "edge_options": edge_options_with_defaults(edge_options),
+        # Strategies should agree inside the window, but a result is only reused for its own
+        "clone_strategy": clone_strategy,
+    }
+    if head_sha:
+        cache_key = make_cache_key(repo_name, head_sha, parameters)
+        graphs = result_cache.get(cache_key)
+        if graphs is not None:
+            send_progress("Loaded cached analysis for this commit.")
+            graphs.setdefault("analysis_id", cache_key)
+            return graphs
+
+    # The commit looked up above is analysed, even if more was pushed before the fetch
+    graphs, analysed_sha = _generate_graph_set_at(repo_url, send_progress, clone_strategy, edge_options, job, head_sha)
+    # The stored result is what the file ownership endpoints page through (file_ownership.py);
+    # it is keyed on the commit actually analysed.
+    graphs["analysis_id"] = make_cache_key(repo_name, analysed_sha, parameters)
+    result_cache.put(graphs["analysis_id"], graphs)
     return graphs
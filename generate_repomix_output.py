@@ -1,62 +1,46 @@
 import subprocess
 import shutil
-import time
+import tempfile
 import os
-import tiktoken
 
-def count_tokens_llm(text, model="gpt-3.5-turbo"):
-    encoding = tiktoken.encoding_for_model(model)
-    return len(encoding.encode(text))
+from token_budget import REPOMIX_TOKEN_LIMIT, count_tokens
+from workspace import workspace_manager
 
-def remove_readonly(func, path, _):
-    # Helper function to remove readonly permission and retry deletion.
-    os.chmod(path, 0o777)
-    func(path)
-    
-def generate_repomix_output(repo_url,send_progress):
+# npx is looked up on PATH (npx.cmd on Windows) unless NPX_PATH points at it.
+NPX = os.getenv("NPX_PATH") or shutil.which("npx") or "npx"
+
+def generate_repomix_output(repo_url,send_progress,token_limit=REPOMIX_TOKEN_LIMIT):
     """
-    Clone the repository, run Repomix with XML output, and return the XML data.
-    
+    Run Repomix with XML output over a working tree of the repository, and return the XML data
+    with its token count.
+
+    The working tree comes from the shared workspace manager, so the repository is
+    fetched into the same cached mirror /generate_graphs uses instead of being cloned again.
+
     :param repo_url: The URL of the Git repository.
-    :return: The contents of repomix-output.xml as a string.
+    :param token_limit: Counting stops once the output is over this many tokens.
+    :return: A token_budget.TokenCount; its `text` holds the contents of
+             repomix-output.xml, or None when the output is over `token_limit`.
     
     """
-    repo_name = repo_url.split("/")[-1].replace(".git", "")
-    repo_dir = f"temp_repos/{repo_name}"
-    
-    # If the directory exists, delete it
-    if os.path.exists(repo_dir):
-        shutil.rmtree(repo_dir, onerror=remove_readonly)
-        
-    # Clone the repository
-    send_progress("Getting repository data...")
-    subprocess.run(["C:\\Program Files\\Git\\bin\\git.exe", "clone", repo_url, repo_dir], check=True)
-    
-    # Run Repomix in XML mode
-    # subprocess.run(["C:\\Program Files\\nodejs\\npx.cmd", "repomix","--compress", "--style", "XML"], cwd=repo_dir, check=True)
-    send_progress("Running RepoMix...")
-    subprocess.run([
-    "C:\\Program Files\\nodejs\\npx.cmd", "repomix",
-    "--compress",
-    "--remove-empty-lines",
-    "--remove-comments",
-    "--ignore", "**/*.jpeg,**/*.png,**/*.svg,linux/,macos/,test/,web/,windows/,**/*.json"], cwd=repo_dir, check=True)
-
-
-    # Read the XML output file
-    output_file = os.path.join(repo_dir, "repomix-output.xml")
-    with open(output_file, "r", encoding="utf-8") as file:
-        repo_data = file.read()
-
-    # Attempt to delete the temporary directory
-    try:
-        shutil.rmtree(repo_dir, onerror=remove_readonly)
-    except PermissionError:
-        time.sleep(0.5) 
-        shutil.rmtree(repo_dir, onerror=remove_readonly)
-
-    token_count = count_tokens_llm(repo_data)
-
-    return repo_data, token_count
-
+    repo_name = repo_url.split("/")[-2] + "/" + repo_url.split("/")[-1].replace(".git", "")
 
+    send_progress("Getting repository data...")
+    with workspace_manager.workspace(repo_name, repo_url) as repo_dir, \
+            tempfile.TemporaryDirectory() as output_dir:
+        # The working tree may be shared, so the output goes to a directory of our own
+        output_file = os.path.join(output_dir, "repomix-output.xml")
+
+        # Run Repomix in XML mode
+        send_progress("Running RepoMix...")
+        subprocess.run([
+        NPX, "repomix",
+        "--compress",
+        "--remove-empty-lines",
+        "--remove-comments",
+        "--output", output_file,
+        "--ignore", "**/*.jpeg,**/*.png,**/*.svg,linux/,macos/,test/,web/,windows/,**/*.json"], cwd=repo_dir, check=True)
+
+        # Read and tokenize the XML output file in one streamed pass
+        send_progress("Counting tokens...")
+        return count_tokens(output_file, token_limit)
@@ -0,0 +1,281 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+GITHUB_API_URL = "https://api.github.com"
+# Connections kept open to the API, shared by all request threads.
+GITHUB_POOL_SIZE = int(os.getenv("GITHUB_POOL_SIZE", "10"))
+# Responses are served from memory for GITHUB_CACHE_TTL seconds, then revalidated with
+# their ETag; a 304 answer does not count against the rate limit.
+GITHUB_CACHE_ENTRIES = int(os.getenv("GITHUB_CACHE_ENTRIES", "1024"))
+GITHUB_CACHE_TTL = float(os.getenv("GITHUB_CACHE_TTL", "60"))
+GITHUB_TIMEOUT = float(os.getenv("GITHUB_TIMEOUT", "30"))
+# Share of each rate-limit bucket kept for interactive requests: background jobs queue
+# once only this much is left. Interactive requests give up after the max wait.
+RATE_LIMIT_BACKGROUND_RESERVE = float(os.getenv("RATE_LIMIT_BACKGROUND_RESERVE", "0.2"))
+RATE_LIMIT_INTERACTIVE_MAX_WAIT = float(os.getenv("RATE_LIMIT_INTERACTIVE_MAX_WAIT", "30"))
+# Retries of a request GitHub answered with a rate-limit error.
+RATE_LIMIT_RETRIES = 3
+
+# Request priorities, most urgent first.
+INTERACTIVE = "interactive"
+BACKGROUND = "background"
+
+
+class RateLimitExceeded(requests.RequestException):
+    """Raised when an interactive request would have to wait too long for quota."""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class RateLimitScheduler:
+    """
+    Process-wide view of the token's GitHub quota, shared by all jobs and request
+    handlers. Every request takes one unit from its resource's bucket ("core",
+    "search", "graphql") before it is sent, so concurrent jobs can't overspend between
+    two responses. Each response's X-RateLimit-* headers then reset the bucket to what
+    GitHub reports, less the requests still in flight, so quota GitHub didn't charge
+    (e.g. 304 revalidations) flows back.
+
+    When a bucket runs low, requests queue until it resets instead of failing.
+    Background requests stop at the reserve and also wait while any interactive
+    request is queued, so /search keeps working during large analyses.
+    """
+
+    def __init__(self, background_reserve=RATE_LIMIT_BACKGROUND_RESERVE,
+                 interactive_max_wait=RATE_LIMIT_INTERACTIVE_MAX_WAIT):
+        self.background_reserve = background_reserve
+        self.interactive_max_wait = interactive_max_wait
+        self._buckets = {}
+        self._waiting = {INTERACTIVE: 0, BACKGROUND: 0}
+        self._in_flight = {}
+        self._condition = threading.Condition()
+
+    def _floor(self, bucket, priority):
+        if priority == INTERACTIVE:
+            return 0
+        return int(bucket["limit"] * self.background_reserve)
+
+    def acquire(self, resource, priority=BACKGROUND):
+        """
+        Blocks until `resource` has quota for a request of `priority`, then takes one unit.
+        Call release() once the response (or error) is in.
+        """
+        deadline = time.monotonic() + self.interactive_max_wait if priority == INTERACTIVE else None
+        with self._condition:
+            self._waiting[priority] += 1
+            try:
+                while True:
+                    now = time.time()
+                    bucket = self._buckets.get(resource)
+                    if bucket is not None and now >= bucket["reset"]:
+                        # The window has passed; assume a full bucket until headers say otherwise
+                        if bucket["limit"]:
+                            bucket["remaining"] = bucket["limit"]
+                        else:
+                            del self._buckets[resource]
+                            bucket = None
+                    has_quota = bucket is None or bucket["remaining"] > self._floor(bucket, priority)
+                    if has_quota and (priority == INTERACTIVE or not self._waiting[INTERACTIVE]):
+                        if bucket is not None:
+                            bucket["remaining"] -= 1
+                        self._in_flight[resource] = self._in_flight.get(resource, 0) + 1
+                        return
+
+                    wait = max(bucket["reset"] - now, 0) + 1 if not has_quota else 1
+                    if deadline is not None:
+                        left = deadline - time.monotonic()
+                        if left <= 0 or (not has_quota and wait > left):
+                            raise RateLimitExceeded(
+                                f"GitHub {resource} rate limit exhausted, try again later.", retry_after=int(wait) + 1
+                            )
+                        wait = min(wait, left)
+                    self._condition.wait(timeout=min(wait, 5))
+            finally:
+                self._waiting[priority] -= 1
+                self._condition.notify_all()
+
+    def release(self, resource):
+        with self._condition:
+            self._in_flight[resource] -= 1
+
+    def update(self, resource, limit, remaining, reset):
+        with self._condition:
+            bucket = self._buckets.get(resource)
+            if bucket is not None and reset < bucket["reset"]:
+                return  # a late response from an earlier window
+            # GitHub's count is authoritative; requests sent after this response was
+            # produced haven't been charged in it yet
+            remaining = max(remaining - self._in_flight.get(resource, 0), 0)
+            self._buckets[resource] = {"limit": limit, "remaining": remaining, "reset": reset}
+            self._condition.notify_all()
+        if limit and remaining < limit * 0.1:
+            logging.warning("GitHub %s rate limit low: %d of %d left", resource, remaining, limit)
+
+    def exhaust(self, resource, retry_after):
+        """
+        Marks `resource` as empty for `retry_after` seconds (after a rate-limit error).
+        """
+        with self._condition:
+            bucket = self._buckets.setdefault(resource, {"limit": 0, "remaining": 0, "reset": 0})
+            bucket["remaining"] = 0
+            bucket["reset"] = max(bucket["reset"], int(time.time() + retry_after))
+
+    def snapshot(self):
+        """
+        Returns ({resource: {"limit", "remaining", "reset"}}, {priority: waiting requests}).
+        """
+        with self._condition:
+            return {resource: dict(bucket) for resource, bucket in self._buckets.items()}, dict(self._waiting)
+
+
+def _retry_after(value, default=60):
+    """
+    Seconds to wait from a Retry-After header, either delay-seconds or an HTTP date.
+    """
+    if value is None:
+        return default
+    try:
+        return max(int(value), 0)
+    except ValueError:
+        pass
+    try:
+        return max(int(parsedate_to_datetime(value).timestamp() - time.time()) + 1, 0)
+    except (TypeError, ValueError):
+        return default
+
+
+def _resource(url):
+    path = urlparse(url).path
+    if path.startswith("/search/"):
+        return "search"
+    if path.startswith("/graphql"):
+        return "graphql"
+    return "core"
+
+
+class _CacheEntry:
+    def __init__(self, response):
+        self.response = response
+        self.etag = response.headers.get("ETag")
+        self.fetched_at = time.monotonic()
+
+
+class GitHubClient:
+    """
+    Shared HTTP client for the GitHub REST API: one pooled requests.Session (so requests
+    reuse connections instead of paying a TLS handshake each), an LRU cache of GET
+    responses revalidated with If-None-Match, and a RateLimitScheduler every request
+    that goes out waits on.
+    """
+
+    def __init__(self, token=None, base_url=GITHUB_API_URL, cache_entries=GITHUB_CACHE_ENTRIES,
+                 cache_ttl=GITHUB_CACHE_TTL, pool_size=GITHUB_POOL_SIZE, timeout=GITHUB_TIMEOUT, scheduler=None):
+        self.token = token
+        self.scheduler = scheduler or RateLimitScheduler()
+        self.base_url = base_url.rstrip("/")
+        self.cache_entries = cache_entries
+        self.cache_ttl = cache_ttl
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers["Accept"] = "application/vnd.github+json"
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _url(self, path):
+        if path.startswith(("https://", "http://")):
+            return path
+        return f"{self.base_url}/{path.lstrip('/')}"
+
+    def _headers(self):
+        # Read at request time so a token loaded from .env after import is picked up
+        token = self.token or os.getenv("GITHUB_TOKEN")
+        return {"Authorization": f"token {token}"} if token else {}
+
+    def _send(self, method, url, priority, **kwargs):
+        resource = _resource(url)
+        for attempt in range(RATE_LIMIT_RETRIES + 1):
+            self.scheduler.acquire(resource, priority)
+            try:
+                response = self.session.request(method, url, timeout=self.timeout, **kwargs)
+            finally:
+                self.scheduler.release(resource)
+            self._track_rate_limit(response, resource)
+            rate_limited = response.status_code in (403, 429) and (
+                response.headers.get("X-RateLimit-Remaining") == "0" or "Retry-After" in response.headers
+            )
+            if not rate_limited or attempt == RATE_LIMIT_RETRIES:
+                return response
+            # Secondary limits only send Retry-After; primary ones are covered by the headers
+            retry_after = _retry_after(response.headers.get("Retry-After"))
+            logging.warning("GitHub rate-limited %s, retrying in %ss", url, retry_after)
+            if response.headers.get("X-RateLimit-Remaining") != "0":
+                self.scheduler.exhaust(resource, retry_after)
+
+    def get(self, path, params=None, priority=BACKGROUND):
+        """
+        GETs `path` (relative to the API root, or a full URL) and returns the
+        requests.Response. Fresh cached responses are returned without a request; stale
+        ones are revalidated and returned again on 304. Requests to GitHub wait for
+        quota first, interactive ones ahead of background ones.
+        """
+        url = self._url(path)
+        key = (url, tuple(sorted((params or {}).items())))
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is not None:
+                self._cache.move_to_end(key)
+                if time.monotonic() - entry.fetched_at < self.cache_ttl:
+                    return entry.response
+
+        headers = self._headers()
+        if entry is not None and entry.etag:
+            headers["If-None-Match"] = entry.etag
+        response = self._send("GET", url, priority, params=params, headers=headers)
+
+        if response.status_code == 304 and entry is not None:
+            with self._lock:
+                entry.fetched_at = time.monotonic()
+            return entry.response
+        if response.status_code == 200:
+            with self._lock:
+                self._cache[key] = _CacheEntry(response)
+                self._cache.move_to_end(key)
+                while len(self._cache) > self.cache_entries:
+                    self._cache.popitem(last=False)
+        return response
+
+    def post(self, path, json=None, priority=BACKGROUND):
+        """
+        POSTs `json` to `path` (e.g. "graphql"). Never cached.
+        """
+        return self._send("POST", self._url(path), priority, json=json, headers=self._headers())
+
+    def has_token(self):
+        return bool(self.token or os.getenv("GITHUB_TOKEN"))
+
+    def _track_rate_limit(self, response, resource):
+        remaining = response.headers.get("X-RateLimit-Remaining")
+        if remaining is None:
+            return
+        self.scheduler.update(
+            response.headers.get("X-RateLimit-Resource", resource),
+            int(response.headers.get("X-RateLimit-Limit", 0)),
+            int(remaining),
+            int(response.headers.get("X-RateLimit-Reset", 0)),
+        )
+
+
+github_client = GitHubClient()
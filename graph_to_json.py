@@ -9,3 +9,22 @@ def graph_to_json(graph, centrality):
         for u, v, d in graph.edges(data=True)
     ]
     return {"nodes": nodes, "edges": edges}
+
+
+def graph_views(graph, centrality, key_nodes):
+    """
+    Builds the full network view and the key-collaboration view (class 1 for key
+    developers, 2 for everyone else) in one pass over the graph. Both views share the
+    same edge list, which the response serializer then encodes only once.
+    """
+    edges = [
+        {"source": u, "target": v, "weight": d.get("weight", 1)}
+        for u, v, d in graph.edges(data=True)
+    ]
+    network_nodes = []
+    key_collab_nodes = []
+    for node, data in graph.nodes(data=True):
+        size = centrality[node]
+        network_nodes.append({"id": node, "size": size, "class": data.get('class', None)})
+        key_collab_nodes.append({"id": node, "size": size, "class": 1 if node in key_nodes else 2})
+    return {"nodes": network_nodes, "edges": edges}, {"nodes": key_collab_nodes, "edges": edges}
@@ -0,0 +1,86 @@
+"""
+Optional compact wire formats for graph sets, chosen by the client's Accept header.
+
+The default format (graph_to_json) repeats both node names on every edge. The columnar
+format sends a node table once and edges as integer indexes into it:
+
+    {"nodes": {"id": [...], "size": [...], "class": [...]},
+     "edges": {"source": [0, 0, 1, ...], "target": [1, 2, 2, ...], "weight": [...]}}
+
+as JSON, or as MessagePack when the optional `msgpack` package is installed.
+"""
+try:
+    import msgpack
+except ImportError:  # optional; the columnar JSON format is always available
+    msgpack = None
+
+JSON = "application/json"
+COLUMNAR_JSON = "application/vnd.busfactor.graph-columnar+json"
+COLUMNAR_MSGPACK = "application/vnd.busfactor.graph-columnar+msgpack"
+
+# The views of a graph set that are converted; everything else is sent as is.
+GRAPH_VIEWS = ("network_graph", "key_collab")
+
+
+def available_formats():
+    formats = [JSON, COLUMNAR_JSON]
+    if msgpack is not None:
+        formats.append(COLUMNAR_MSGPACK)
+    return formats
+
+
+def negotiate_format(accept_mimetypes):
+    """
+    Picks the graph format from werkzeug's request.accept_mimetypes. Plain JSON wins
+    for */* or a missing header, so existing clients are unaffected.
+    """
+    return accept_mimetypes.best_match(available_formats(), default=JSON) or JSON
+
+
+def columnar_graph(view, _cache=None):
+    """
+    Converts {"nodes": [...], "edges": [...]} (graph_to_json) to the columnar form.
+    """
+    nodes = view["nodes"]
+    ids = [node["id"] for node in nodes]
+    columns = {
+        "nodes": {
+            "id": ids,
+            "size": [node["size"] for node in nodes],
+            "class": [node["class"] for node in nodes],
+        },
+    }
+    edges = view["edges"]
+    cached = _cache.get(id(edges)) if _cache is not None else None
+    if cached is not None and cached[0] == ids:
+        # Views sharing one edge list over the same nodes share the edge columns too
+        columns["edges"] = cached[1]
+        return columns
+    index = {node_id: i for i, node_id in enumerate(ids)}
+    columns["edges"] = {
+        "source": [index[edge["source"]] for edge in edges],
+        "target": [index[edge["target"]] for edge in edges],
+        "weight": [edge["weight"] for edge in edges],
+    }
+    if _cache is not None:
+        _cache[id(edges)] = (ids, columns["edges"])
+    return columns
+
+
+def columnar_graph_set(graphs):
+    """
+    Returns a copy of a graph set with its graph views in the columnar form.
+    """
+    cache = {}
+    converted = dict(graphs)
+    for name in GRAPH_VIEWS:
+        if name in converted:
+            converted[name] = dict(columnar_graph(converted[name], cache), format="columnar")
+    return converted
+
+
+def pack(obj):
+    """
+    MessagePack encoding of `obj` (only with COLUMNAR_MSGPACK negotiated).
+    """
+    return msgpack.packb(obj, use_bin_type=True)
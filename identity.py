@@ -0,0 +1,172 @@
+import logging
+import os
+import re
+import subprocess
+from collections import Counter
+from functools import lru_cache
+
+import numpy as np
+from rapidfuzz import fuzz, process
+
+# Normalised names at least this similar (rapidfuzz ratio, 0-100) are merged as aliases
+# of one contributor; 0 turns merging off. Short names are never merged, as a single
+# character difference is a large share of them.
+IDENTITY_FUZZY_THRESHOLD = float(os.getenv("IDENTITY_FUZZY_THRESHOLD", "95"))
+IDENTITY_FUZZY_MIN_LENGTH = int(os.getenv("IDENTITY_FUZZY_MIN_LENGTH", "8"))
+
+_NON_ALPHANUMERIC = re.compile(r"[^a-zA-Z0-9]")
+# "Name <email>", or just "<email>" when the mapped name is empty
+_MAILMAP_LINE = re.compile(r"^(?:(.*) )?<([^<>]*)>$")
+# Rows of the similarity matrix computed at once, to bound its memory.
+_CDIST_CHUNK = 1024
+
+
+@lru_cache(maxsize=65536)
+def normalize_name(name):
+    """
+    Reduces a username or display name to lower-case alphanumerics, the key contributors
+    are grouped and matched to Jira users by.
+    """
+    return _NON_ALPHANUMERIC.sub("", name or "").lower()
+
+
+def check_mailmap(git_dir, identities):
+    """
+    Maps (name, email) pairs to their canonical form per the repository's .mailmap (for a
+    bare repository git reads it from HEAD), with one `git check-mailmap` call.
+    Returns {(name, email): (name, email)}.
+    """
+    identities = [
+        (name, email) for name, email in identities
+        # check-mailmap reads "Name <email>" lines and can't take these characters back
+        if not any(c in f"{name}{email}" for c in "<>\n")
+    ]
+    if not identities:
+        return {}
+    lines = "".join(f"{name} <{email}>\n" for name, email in identities)
+    try:
+        output = subprocess.run(
+            ["git", "--git-dir", git_dir, "check-mailmap", "--stdin"],
+            input=lines,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            encoding="utf-8",
+            errors="replace",
+            check=True,
+        ).stdout
+    except subprocess.CalledProcessError as e:
+        logging.warning("git check-mailmap failed, ignoring .mailmap: %s", e.stderr.strip())
+        return {}
+
+    mapped = {}
+    for identity, line in zip(identities, output.splitlines()):
+        match = _MAILMAP_LINE.match(line)
+        if match:
+            mapped[identity] = (match.group(1) or "", match.group(2))
+    return mapped
+
+
+def fuzzy_aliases(counts, threshold=IDENTITY_FUZZY_THRESHOLD, min_length=IDENTITY_FUZZY_MIN_LENGTH):
+    """
+    Groups near-duplicate normalised names with one batched rapidfuzz cdist and returns
+    {alias: canonical} for the names that are merged into another one. `counts` maps
+    normalised names to their number of commits; the most active name of a group wins.
+    """
+    names = [name for name in counts if len(name) >= min_length]
+    if threshold <= 0 or len(names) < 2:
+        return {}
+
+    parent = list(range(len(names)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for start in range(0, len(names), _CDIST_CHUNK):
+        scores = process.cdist(
+            names[start:start + _CDIST_CHUNK], names, scorer=fuzz.ratio, score_cutoff=threshold,
+            dtype=np.uint8, workers=-1,
+        )
+        for row, column in zip(*np.nonzero(scores)):
+            i, j = find(start + row), find(column)
+            if i != j:
+                parent[max(i, j)] = min(i, j)
+
+    groups = {}
+    for i, name in enumerate(names):
+        groups.setdefault(find(i), []).append(name)
+    aliases = {}
+    for members in groups.values():
+        if len(members) > 1:
+            canonical = max(members, key=lambda name: counts[name])
+            aliases.update((name, canonical) for name in members if name != canonical)
+    return aliases
+
+
+class IdentityResolver:
+    """
+    Resolves commit authors to contributor usernames once per distinct (name, email)
+    pair, so the commit loop only does a dict lookup.
+
+    An author is first mapped through .mailmap, then matched to a GitHub login by email
+    or display name, falling back to the name itself. Usernames whose normalised form is
+    a near-duplicate of a more active contributor's (see fuzzy_aliases) are then
+    replaced by that contributor's most frequent username.
+    """
+
+    def __init__(self, email_to_username, name_to_username, is_bot=None, fuzzy_threshold=IDENTITY_FUZZY_THRESHOLD):
+        self.email_to_username = email_to_username
+        self.name_to_username = name_to_username
+        self.is_bot = is_bot or (lambda username: False)
+        self.fuzzy_threshold = fuzzy_threshold
+        self._resolved = {}
+
+    def resolve_all(self, author_counts, git_dir=None):
+        """
+        Resolves every (name, email) in `author_counts` ({(name, email): commits},
+        e.g. CommitTable.author_counts()). Returns the number of merged aliases.
+        """
+        mailmap = check_mailmap(git_dir, author_counts) if git_dir else {}
+
+        usernames = {}
+        username_counts = Counter()
+        for identity, count in author_counts.items():
+            name, email = mailmap.get(identity, identity)
+            username = self.email_to_username.get(email) or self.name_to_username.get(name) or name
+            usernames[identity] = (username, email)
+            username_counts[username] += count
+
+        # Bots are filtered out later by username, so they are never merged with people
+        key_counts = Counter()
+        usernames_by_key = {}
+        for username, count in username_counts.items():
+            if self.is_bot(username):
+                continue
+            key = normalize_name(username)
+            key_counts[key] += count
+            usernames_by_key.setdefault(key, Counter())[username] += count
+        aliases = fuzzy_aliases(key_counts, self.fuzzy_threshold)
+        canonical_username = {
+            alias: usernames_by_key[canonical].most_common(1)[0][0] for alias, canonical in aliases.items()
+        }
+        if aliases:
+            logging.info("Merged %d near-duplicate contributor aliases", len(aliases))
+
+        self._resolved = {
+            identity: (canonical_username.get(normalize_name(username), username), email)
+            for identity, (username, email) in usernames.items()
+        }
+        return len(aliases)
+
+    def resolve(self, name, email):
+        """
+        Returns (username, canonical email) for a commit author.
+        """
+        resolved = self._resolved.get((name, email))
+        if resolved is None:
+            # Not part of resolve_all (shouldn't happen); resolve without aliases
+            username = self.email_to_username.get(email) or self.name_to_username.get(name) or name
+            resolved = self._resolved[(name, email)] = (username, email)
+        return resolved
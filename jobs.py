@@ -0,0 +1,259 @@
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+# Analyses running at the same time, and the most that may be queued or running at once.
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_QUEUE_LIMIT = int(os.getenv("JOB_QUEUE_LIMIT", "8"))
+# Finished jobs (and their results) are forgotten after this many seconds.
+JOB_RESULT_TTL = int(os.getenv("JOB_RESULT_TTL", "3600"))
+
+# Per-job resource budgets; 0 means unlimited.
+JOB_MAX_SECONDS = float(os.getenv("JOB_MAX_SECONDS", "0"))
+JOB_MAX_COMMITS = int(os.getenv("JOB_MAX_COMMITS", "0"))
+JOB_MAX_EDGES = int(os.getenv("JOB_MAX_EDGES", "0"))
+JOB_MAX_DISK_BYTES = int(os.getenv("JOB_MAX_DISK_BYTES", "0"))
+
+
+def normalize_repo_url(url):
+    """
+    Reduces the different spellings of a repository URL to "host/owner/repo".
+    """
+    url = url.strip().lower()
+    for prefix in ("https://", "http://", "git@"):
+        if url.startswith(prefix):
+            url = url[len(prefix):]
+    url = url.replace(":", "/").rstrip("/")
+    if url.endswith(".git"):
+        url = url[:-len(".git")]
+    if url.startswith("www."):
+        url = url[len("www."):]
+    return url
+
+
+class QueueFullError(Exception):
+    """Raised when a job is submitted while the queue is at JOB_QUEUE_LIMIT."""
+
+
+class JobCancelled(Exception):
+    """Raised at the next checkpoint after a job has been cancelled."""
+
+
+class BudgetExceeded(Exception):
+    """Raised when a job goes over one of its resource budgets."""
+
+
+class JobContext:
+    """
+    Passed through the pipeline stages so they can stop cooperatively: check() is called
+    at natural boundaries (after the clone, per commit, before and after edge building,
+    per file when sizing) and raises once the job is cancelled or over its time budget.
+    The time budget counts from start(), when a worker picks the job up, so time spent
+    queued is free. The other budgets are checked where their quantity becomes known.
+    """
+
+    def __init__(self, max_seconds=JOB_MAX_SECONDS, max_commits=JOB_MAX_COMMITS, max_edges=JOB_MAX_EDGES,
+                 max_disk_bytes=JOB_MAX_DISK_BYTES):
+        self.max_seconds = max_seconds
+        self.max_commits = max_commits
+        self.max_edges = max_edges
+        self.max_disk_bytes = max_disk_bytes
+        self.stage = "queued"
+        self._cancelled = threading.Event()
+        self._started = None
+
+    def start(self):
+        if self._started is None:
+            self._started = time.monotonic()
+
+    def cancel(self):
+        self._cancelled.set()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def check(self, stage=None):
+        if stage is not None:
+            self.stage = stage
+        if self._cancelled.is_set():
+            raise JobCancelled(f"Job cancelled during {self.stage}.")
+        if self.max_seconds and self._started is not None and time.monotonic() - self._started > self.max_seconds:
+            raise BudgetExceeded(f"Time budget of {self.max_seconds:g}s exceeded during {self.stage}.")
+
+    def checked(self, items, stage):
+        """
+        Yields from `items`, running check() before each one.
+        """
+        for item in items:
+            self.check(stage)
+            yield item
+
+    def _check_budget(self, name, value, limit):
+        self.check()
+        if limit and value > limit:
+            raise BudgetExceeded(f"{name} budget exceeded during {self.stage}: {value:,} > {limit:,}.")
+
+    def check_commits(self, count):
+        self._check_budget("Commit", count, self.max_commits)
+
+    def check_edges(self, count):
+        self._check_budget("Edge", count, self.max_edges)
+
+    def check_disk(self, num_bytes):
+        self._check_budget("Disk", num_bytes, self.max_disk_bytes)
+
+
+class Job:
+    def __init__(self):
+        self.id = uuid.uuid4().hex
+        self.status = "queued"
+        self.result = None
+        self.error = None
+        self.context = JobContext()
+        # Set by the job's function (e.g. a ProgressReporter) so late subscribers can be caught up
+        self.progress = None
+        self.created_at = time.time()
+        self.finished_at = None
+
+    def to_dict(self):
+        data = {"job_id": self.id, "status": self.status}
+        if self.status == "done":
+            data["result"] = self.result
+        elif self.status in ("failed", "cancelled"):
+            data["error"] = self.error
+            data["stage"] = self.context.stage
+        return data
+
+
+class JobManager:
+    """
+    Runs long analyses on a bounded thread pool. submit() returns immediately with a Job;
+    when JOB_QUEUE_LIMIT jobs are already queued or running it raises QueueFullError so
+    callers can answer 429 instead of piling up work.
+    """
+
+    def __init__(self, max_workers=JOB_WORKERS, max_pending=JOB_QUEUE_LIMIT, result_ttl=JOB_RESULT_TTL):
+        self.max_pending = max_pending
+        self.result_ttl = result_ttl
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._jobs = {}
+        self._in_flight = {}
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def submit(self, fn, *args, dedupe_key=None, **kwargs):
+        """
+        Queues fn(job, *args, **kwargs); its return value becomes the job's result.
+
+        If a job with the same `dedupe_key` is still queued or running, that job is
+        returned instead, so identical requests share one computation, result and
+        progress room.
+        """
+        with self._lock:
+            self._forget_expired()
+            in_flight = self._in_flight.get(dedupe_key) if dedupe_key is not None else None
+            if in_flight is not None and not in_flight.context.cancelled:
+                return in_flight
+            if self._pending >= self.max_pending:
+                raise QueueFullError(f"Too many analyses in progress ({self._pending}), try again later.")
+            job = Job()
+            self._jobs[job.id] = job
+            if dedupe_key is not None:
+                self._in_flight[dedupe_key] = job
+            self._pending += 1
+        self._executor.submit(self._run, job, dedupe_key, fn, args, kwargs)
+        return job
+
+    def _run(self, job, dedupe_key, fn, args, kwargs):
+        job.status = "running"
+        job.context.start()
+        try:
+            job.context.check("start")
+            job.result = fn(job, *args, **kwargs)
+            job.status = "done"
+        except JobCancelled as e:
+            logging.info("Job %s cancelled", job.id)
+            job.error = str(e)
+            job.status = "cancelled"
+        except Exception as e:
+            logging.exception("Job %s failed", job.id)
+            job.error = str(e)
+            job.status = "failed"
+        finally:
+            job.finished_at = time.time()
+            with self._lock:
+                self._pending -= 1
+                if dedupe_key is not None and self._in_flight.get(dedupe_key) is job:
+                    del self._in_flight[dedupe_key]
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _forget_expired(self):
+        now = time.time()
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job.finished_at is not None and now - job.finished_at > self.result_ttl
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+
+class _Call:
+    def __init__(self, context):
+        self.context = context
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key: the first caller runs the work, the
+    ones arriving while it is in flight wait for it and get the same result (or error).
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def run(self, key, fn, context=None, on_join=None):
+        """
+        Runs fn(context) once for all concurrent callers of `key`. A caller that joins an
+        in-flight call gets on_join(leader_context, context) called first, e.g. to
+        subscribe its progress room to the leader's progress reporter.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call(context)
+                self._calls[key] = call
+
+        if not leader:
+            if on_join is not None:
+                on_join(call.context, context)
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn(context)
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+
+job_manager = JobManager()
+single_flight = SingleFlight()
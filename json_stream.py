@@ -0,0 +1,136 @@
+"""
+Streams large JSON responses (graph sets) with orjson and gzip/brotli compression,
+instead of building one big string with jsonify.
+"""
+import os
+import zlib
+
+import orjson
+from flask import Response
+
+try:
+    import brotli
+except ImportError:  # optional; gzip is offered instead
+    brotli = None
+
+# List elements encoded per chunk, and the size chunks are coalesced to before they
+# are compressed and written.
+JSON_STREAM_CHUNK_ITEMS = 10_000
+JSON_STREAM_BUFFER_BYTES = 64 * 1024
+JSON_GZIP_LEVEL = int(os.getenv("JSON_GZIP_LEVEL", "6"))
+JSON_BROTLI_QUALITY = int(os.getenv("JSON_BROTLI_QUALITY", "5"))
+
+_ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+# Containers nested deeper than this are always encoded in one orjson call.
+_MAX_WALK_DEPTH = 3
+
+
+def _shared_containers(obj, depth=0, seen=None, shared=None):
+    # ids of the dicts/lists reachable more than once, e.g. the edge list both graph
+    # views point to
+    seen = set() if seen is None else seen
+    shared = set() if shared is None else shared
+    if isinstance(obj, (dict, list)) and depth <= _MAX_WALK_DEPTH:
+        if id(obj) in seen:
+            shared.add(id(obj))
+            return shared
+        seen.add(id(obj))
+        if isinstance(obj, dict):
+            for value in obj.values():
+                _shared_containers(value, depth + 1, seen, shared)
+    return shared
+
+
+def _encode(obj, depth, shared, encoded):
+    if id(obj) in shared:
+        # Encoded once, then the same bytes are written for every occurrence
+        if id(obj) not in encoded:
+            encoded[id(obj)] = orjson.dumps(obj, option=_ORJSON_OPTIONS)
+        yield encoded[id(obj)]
+    elif isinstance(obj, dict) and depth < _MAX_WALK_DEPTH:
+        yield b"{"
+        for i, (key, value) in enumerate(obj.items()):
+            yield (b"," if i else b"") + orjson.dumps(key if isinstance(key, str) else str(key)) + b":"
+            yield from _encode(value, depth + 1, shared, encoded)
+        yield b"}"
+    elif isinstance(obj, list) and len(obj) > JSON_STREAM_CHUNK_ITEMS:
+        yield b"["
+        for start in range(0, len(obj), JSON_STREAM_CHUNK_ITEMS):
+            chunk = orjson.dumps(obj[start:start + JSON_STREAM_CHUNK_ITEMS], option=_ORJSON_OPTIONS)
+            yield (b"," if start else b"") + chunk[1:-1]
+        yield b"]"
+    else:
+        yield orjson.dumps(obj, option=_ORJSON_OPTIONS)
+
+
+def iter_json(obj):
+    """
+    Yields `obj` as JSON in chunks: the top levels of dicts are walked, long lists are
+    encoded JSON_STREAM_CHUNK_ITEMS elements at a time, and a list or dict referenced
+    more than once is encoded only once.
+    """
+    buffer = bytearray()
+    for piece in _encode(obj, 0, _shared_containers(obj), {}):
+        buffer += piece
+        if len(buffer) >= JSON_STREAM_BUFFER_BYTES:
+            yield bytes(buffer)
+            buffer.clear()
+    if buffer:
+        yield bytes(buffer)
+
+
+def negotiate_encoding(accept_encoding):
+    """
+    Picks "br", "gzip" or None from an Accept-Encoding header, preferring brotli.
+    """
+    accepted = set()
+    for part in (accept_encoding or "").split(","):
+        coding, _, params = part.strip().partition(";")
+        if params.strip().replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        accepted.add(coding.strip().lower())
+    if brotli is not None and ("br" in accepted or "*" in accepted):
+        return "br"
+    if "gzip" in accepted or "*" in accepted:
+        return "gzip"
+    return None
+
+
+def compress(chunks, encoding):
+    """
+    Compresses a stream of byte chunks with `encoding` ("br", "gzip" or None).
+    """
+    if encoding == "br":
+        compressor = brotli.Compressor(quality=JSON_BROTLI_QUALITY)
+        for chunk in chunks:
+            out = compressor.process(chunk)
+            if out:
+                yield out
+        yield compressor.finish()
+    elif encoding == "gzip":
+        compressor = zlib.compressobj(JSON_GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        for chunk in chunks:
+            out = compressor.compress(chunk)
+            if out:
+                yield out
+        yield compressor.flush()
+    else:
+        yield from chunks
+
+
+def compressed_response(chunks, accept_encoding=None, status=200, mimetype="application/json", vary="Accept-Encoding"):
+    """
+    Flask response streaming the byte `chunks`, compressed as the client accepts.
+    """
+    encoding = negotiate_encoding(accept_encoding)
+    headers = {"Vary": vary}
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(compress(chunks, encoding), status=status, mimetype=mimetype, headers=headers)
+
+
+def streamed_json_response(obj, accept_encoding=None, status=200, mimetype="application/json", vary="Accept-Encoding"):
+    """
+    Flask response that streams `obj` as JSON, compressed as the client accepts.
+    """
+    return compressed_response(iter_json(obj), accept_encoding, status, mimetype, vary)
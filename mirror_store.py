@@ -0,0 +1,281 @@
+import logging
+import os
+import shutil
+import subprocess
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime, timezone
+
+from commit_miner import history_window
+
+# Bare mirrors of analysed repositories are kept here between requests.
+MIRROR_CACHE_DIR = os.path.join(os.getenv("BUSFACTOR_DATA_DIR", "data"), "mirrors")
+MIRROR_CACHE_MAX_BYTES = int(os.getenv("MIRROR_CACHE_MAX_BYTES", str(10 * 1024 ** 3)))
+
+# "full" downloads the whole object database. "blobless" skips file contents until they
+# are read, "shallow" only fetches the analysis window, "shallow-blobless" does both.
+CLONE_STRATEGIES = ("full", "blobless", "shallow", "shallow-blobless")
+
+# What mirrors fetch from origin. Not `clone --mirror`'s +refs/*:refs/*, which on GitHub
+# also downloads every refs/pull/*/head and /merge with their objects.
+ORIGIN_REFSPECS = ("+refs/heads/*:refs/heads/*", "+refs/tags/*:refs/tags/*")
+
+# GitHub credentials come from this helper, which reads GITHUB_TOKEN from git's own
+# environment when the server asks for them. The token is never written to a mirror's
+# config nor put on a command line, including for lazy blob fetches during mining.
+GIT_CREDENTIAL_HELPER = (
+    '!f() { test "$1" = get && test -n "$GITHUB_TOKEN" || exit 0; '
+    'echo username=x-access-token; echo "password=$GITHUB_TOKEN"; }; f'
+)
+
+
+def install_credential_helper(environ=os.environ):
+    """
+    Configures GIT_CREDENTIAL_HELPER for every git process started from `environ`,
+    through git's GIT_CONFIG_COUNT/KEY/VALUE variables.
+    """
+    count = int(environ.get("GIT_CONFIG_COUNT", "0"))
+    if GIT_CREDENTIAL_HELPER in (environ.get(f"GIT_CONFIG_VALUE_{i}") for i in range(count)):
+        return
+    environ[f"GIT_CONFIG_KEY_{count}"] = "credential.https://github.com.helper"
+    environ[f"GIT_CONFIG_VALUE_{count}"] = GIT_CREDENTIAL_HELPER
+    environ["GIT_CONFIG_COUNT"] = str(count + 1)
+
+
+install_credential_helper()
+
+
+def remove_readonly(func, path, _):
+    # Helper function to remove readonly permission and retry deletion.
+    os.chmod(path, 0o777)
+    func(path)
+
+
+def directory_size(path):
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for filename in filenames:
+            try:
+                total += os.path.getsize(os.path.join(dirpath, filename))
+            except OSError:
+                pass
+    return total
+
+
+def run_git(cmd, watch_path=None, check=None, interval=1.0):
+    """
+    Runs a git command. With `check`, check(size of watch_path in bytes) is called every
+    `interval` seconds while git runs; git is killed if it raises, and the error re-raised.
+    """
+    if check is None:
+        subprocess.run(cmd, check=True)
+        return
+    process = subprocess.Popen(cmd)
+    try:
+        while True:
+            try:
+                returncode = process.wait(timeout=interval)
+                break
+            except subprocess.TimeoutExpired:
+                check(directory_size(watch_path))
+    except BaseException:
+        process.kill()
+        process.wait()
+        raise
+    if returncode:
+        raise subprocess.CalledProcessError(returncode, cmd)
+
+
+# What acquire() hands out: the mirror's path and the SHA its HEAD pointed to right
+# after the fetch. Readers analyse that SHA, so a later fetch can't change their view.
+Mirror = namedtuple("Mirror", ["path", "head"])
+
+
+class MirrorStore:
+    """
+    Persistent store of bare repositories keyed by "owner/repo", fetching the branches
+    and tags of origin (ORIGIN_REFSPECS).
+
+    The first acquire() clones the mirror, later ones run `git fetch`. A per-repo lock is
+    held only while git clones or fetches and HEAD is resolved, so a quick request isn't
+    queued behind a long analysis of the same repository; fetches only add objects, and
+    readers work from their HEAD snapshot. Mirrors in use (acquired and not yet
+    released) are never evicted. After each release the least recently used mirrors
+    are evicted until the store fits in `max_bytes`.
+    """
+
+    def __init__(self, root=MIRROR_CACHE_DIR, max_bytes=MIRROR_CACHE_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._locks = {}
+        self._users = {}
+        self._locks_guard = threading.Lock()
+        self._fetched_at = {}
+
+    @staticmethod
+    def _key(repo_name, strategy):
+        # Mirrors cloned with different strategies hold different objects, keep them apart.
+        return repo_name if strategy == "full" else f"{repo_name}@{strategy}"
+
+    def path_for(self, repo_name, strategy="full"):
+        owner, name = self._key(repo_name, strategy).split("/", 1)
+        return os.path.join(self.root, owner, name + ".git")
+
+    def _lock_for(self, key):
+        with self._locks_guard:
+            return self._locks.setdefault(key.lower(), threading.Lock())
+
+    @staticmethod
+    def _configure_origin(path, remote_url):
+        # Also replaces any token URL an older version left in the config
+        subprocess.run(["git", "--git-dir", path, "remote", "set-url", "--", "origin", remote_url], check=True)
+        config = ["git", "--git-dir", path, "config"]
+        refspecs = subprocess.run(config + ["--get-all", "remote.origin.fetch"],
+                                  stdout=subprocess.PIPE, encoding="utf-8").stdout.split()
+        if refspecs == list(ORIGIN_REFSPECS):
+            return
+        subprocess.run(config + ["--replace-all", "remote.origin.fetch", ORIGIN_REFSPECS[0]], check=True)
+        for refspec in ORIGIN_REFSPECS[1:]:
+            subprocess.run(config + ["--add", "remote.origin.fetch", refspec], check=True)
+        # Mirrors made with `clone --mirror` also hold refs/pull/* etc.; drop them
+        subprocess.run(config + ["--unset", "remote.origin.mirror"])
+        refs = subprocess.run(["git", "--git-dir", path, "for-each-ref", "--format=delete %(refname)"],
+                              stdout=subprocess.PIPE, encoding="utf-8", check=True).stdout.splitlines()
+        stale = "".join(ref + "\n" for ref in refs if not ref.startswith(("delete refs/heads/", "delete refs/tags/")))
+        if stale:
+            subprocess.run(["git", "--git-dir", path, "update-ref", "--stdin"], input=stale, encoding="utf-8", check=True)
+
+    def _clone(self, path, remote_url, strategy, check=None):
+        cmd = ["git", "clone", "--bare", "--quiet"]
+        if strategy in ("blobless", "shallow-blobless"):
+            # Blobs are fetched lazily from origin the first time git needs their content.
+            cmd.append("--filter=blob:none")
+        if strategy in ("shallow", "shallow-blobless"):
+            cmd.append("--depth=1")
+        # "--": the URL comes from a request and must not be taken for an option
+        run_git(cmd + ["--", remote_url, path], path, check)
+        self._configure_origin(path, remote_url)
+
+        if strategy in ("shallow", "shallow-blobless"):
+            # Only the analysis window is needed. Its boundary commits are deepened by one
+            # so their numstat is computed against the real parent, as in a full clone.
+            # --shallow-since takes a date; some git versions silently ignore "@<unix time>"
+            _, cutoff, _ = history_window(path)
+            since = datetime.fromtimestamp(cutoff, timezone.utc).isoformat()
+            run_git(["git", "--git-dir", path, "fetch", "--quiet", f"--shallow-since={since}", "origin"], path, check)
+            run_git(["git", "--git-dir", path, "fetch", "--quiet", "--deepen=1", "origin"], path, check)
+
+    def acquire(self, repo_name, remote_url, strategy="full", max_age=None, check=None):
+        """
+        Returns a Mirror (path, HEAD SHA) of an up-to-date mirror of `repo_name`, kept
+        from eviction until release().
+
+        :param remote_url: URL used for cloning/fetching, without credentials (see
+                           GIT_CREDENTIAL_HELPER).
+        :param strategy: One of CLONE_STRATEGIES; decides how the mirror is first cloned.
+        :param max_age: Skip the fetch if this process fetched the mirror less than
+                        `max_age` seconds ago.
+        :param check: Called with the mirror's size in bytes while git clones or fetches
+                      (e.g. JobContext.check_disk); git is stopped if it raises.
+        """
+        if strategy not in CLONE_STRATEGIES:
+            raise ValueError(f"Unknown clone strategy: {strategy}")
+        key = self._key(repo_name, strategy)
+        lock = self._lock_for(key)
+        lock.acquire()
+        try:
+            path = self.path_for(repo_name, strategy)
+            fetched_at = self._fetched_at.get(key)
+            # Lets a second feature reuse the fetch the first one just did
+            if max_age is not None and fetched_at and time.time() - fetched_at < max_age and os.path.isdir(path):
+                logging.info("Using mirror of %s fetched %.0fs ago", key, time.time() - fetched_at)
+            elif os.path.isdir(path):
+                logging.info("Updating cached mirror of %s", key)
+                self._configure_origin(path, remote_url)
+                # Fetching through origin keeps any partial-clone filter and shallow boundary.
+                run_git(["git", "--git-dir", path, "fetch", "--prune", "--quiet", "origin"], path, check)
+                self._fetched_at[key] = time.time()
+            else:
+                logging.info("Creating mirror of %s", key)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                try:
+                    self._clone(path, remote_url, strategy, check)
+                except Exception:
+                    # Don't leave a half-cloned mirror behind for the next request.
+                    if os.path.isdir(path):
+                        shutil.rmtree(path, onerror=remove_readonly)
+                    raise
+                self._fetched_at[key] = time.time()
+            os.utime(path)
+            head = subprocess.run(
+                ["git", "--git-dir", path, "rev-parse", "HEAD"],
+                stdout=subprocess.PIPE, encoding="utf-8", check=True,
+            ).stdout.strip()
+            with self._locks_guard:
+                self._users[key.lower()] = self._users.get(key.lower(), 0) + 1
+            return Mirror(path, head)
+        finally:
+            lock.release()
+
+    def release(self, repo_name, strategy="full"):
+        key = self._key(repo_name, strategy)
+        path = self.path_for(repo_name, strategy)
+        if os.path.isdir(path):
+            os.utime(path)
+        with self._locks_guard:
+            self._users[key.lower()] -= 1
+        self.evict()
+
+    def _mirrors(self):
+        if not os.path.isdir(self.root):
+            return []
+        mirrors = []
+        for owner in os.listdir(self.root):
+            owner_dir = os.path.join(self.root, owner)
+            if not os.path.isdir(owner_dir):
+                continue
+            for entry in os.listdir(owner_dir):
+                if entry.endswith(".git"):
+                    key = owner + "/" + entry[:-len(".git")]
+                    mirrors.append((key, os.path.join(owner_dir, entry)))
+        return mirrors
+
+    def evict(self):
+        """
+        Deletes least recently used mirrors until the store fits in the size budget.
+        Mirrors in use or being fetched are skipped.
+        """
+        mirrors = []
+        total = 0
+        for key, path in self._mirrors():
+            size = directory_size(path)
+            total += size
+            mirrors.append((os.path.getmtime(path), key, path, size))
+        mirrors.sort()
+
+        for _, key, path, size in mirrors:
+            if total <= self.max_bytes:
+                break
+            lock = self._lock_for(key)
+            if not lock.acquire(blocking=False):
+                continue
+            try:
+                # Users only register under the lock we now hold, so this can't change
+                with self._locks_guard:
+                    in_use = self._users.get(key.lower(), 0)
+                if in_use:
+                    continue
+                logging.info("Evicting cached mirror of %s (%d bytes)", key, size)
+                self._fetched_at.pop(key, None)
+                try:
+                    shutil.rmtree(path, onerror=remove_readonly)
+                except PermissionError:
+                    time.sleep(0.5)
+                    shutil.rmtree(path, onerror=remove_readonly)
+                total -= size
+            finally:
+                lock.release()
+
+
+mirror_store = MirrorStore()
@@ -0,0 +1,95 @@
+import logging
+import os
+import threading
+import time
+
+# Upper bound on progress events per second and per job.
+PROGRESS_MAX_RATE_HZ = float(os.getenv("PROGRESS_MAX_RATE_HZ", "10"))
+
+
+class ProgressReporter:
+    """
+    send_progress-compatible callable that emits 'progress' events to the Socket.IO rooms
+    of the callers waiting on one computation instead of the whole namespace.
+
+    Repeated messages (e.g. the same percentage for thousands of commits) are dropped,
+    and emission is capped at `max_rate_hz`. A message that arrives too soon is held
+    back and sent once the interval has passed, unless a newer one replaces it first,
+    so the latest state always reaches the client. final() flushes and is never dropped.
+    """
+
+    def __init__(self, socketio, room, namespace="/progress", max_rate_hz=PROGRESS_MAX_RATE_HZ, extra=None):
+        self.socketio = socketio
+        self.rooms = [room]
+        self.namespace = namespace
+        self.min_interval = 1.0 / max_rate_hz if max_rate_hz > 0 else 0.0
+        self.extra = extra or {}
+        self._last_message = None
+        self._last_emit = 0.0
+        self._pending = None
+        self._timer = None
+        self._lock = threading.Lock()
+
+    def _emit(self, message):
+        logging.debug("Emitting progress to %s: %s", self.rooms, message)
+        for room in self.rooms:
+            self.socketio.emit('progress', {'message': message, **self.extra}, to=room, namespace=self.namespace)
+        self._last_message = message
+        self._last_emit = time.monotonic()
+
+    def __call__(self, message):
+        with self._lock:
+            if message == self._last_message or message == self._pending:
+                return
+            wait = self.min_interval - (time.monotonic() - self._last_emit)
+            if wait <= 0:
+                self._pending = None
+                self._emit(message)
+                return
+            self._pending = message
+            if self._timer is None:
+                self._timer = threading.Timer(wait, self._flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def add_room(self, room):
+        """
+        Also sends all further events to `room` (a caller that joined this computation).
+        """
+        with self._lock:
+            if room not in self.rooms:
+                self.rooms.append(room)
+        # Catch the new subscriber up with the current state.
+        self.replay(room)
+
+    def replay(self, to):
+        """
+        Sends the latest state to `to` only (a room or a client's session id that
+        subscribed late): the held-back message if there is one, else the last emitted
+        one, which after final() is the final message.
+        """
+        with self._lock:
+            # Under the lock so no newer event can be emitted before this older one
+            message = self._pending if self._pending is not None else self._last_message
+            if message is not None:
+                self.socketio.emit('progress', {'message': message, **self.extra}, to=to, namespace=self.namespace)
+
+    def _flush(self):
+        with self._lock:
+            self._timer = None
+            if self._pending is not None:
+                message, self._pending = self._pending, None
+                self._emit(message)
+
+    def final(self, message):
+        """
+        Emits the held-back message (if any) and then `message`, bypassing the rate limit.
+        """
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if self._pending is not None:
+                self._emit(self._pending)
+                self._pending = None
+            self._emit(message)
@@ -0,0 +1,110 @@
+import hashlib
+import json
+import logging
+import os
+import subprocess
+import threading
+from collections import OrderedDict
+
+# Finished analyses are kept in memory and on disk, keyed by repo HEAD and parameters.
+RESULT_CACHE_DIR = os.path.join(os.getenv("BUSFACTOR_DATA_DIR", "data"), "results")
+RESULT_CACHE_MEMORY_ENTRIES = int(os.getenv("RESULT_CACHE_MEMORY_ENTRIES", "32"))
+RESULT_CACHE_DISK_ENTRIES = int(os.getenv("RESULT_CACHE_DISK_ENTRIES", "500"))
+
+
+def remote_head(repo_url):
+    """
+    Returns the SHA the remote's HEAD points to, without cloning anything.
+    """
+    # "--" so a URL starting with "-" can't be read as an option (e.g. --upload-pack)
+    result = subprocess.run(
+        ["git", "ls-remote", "--", repo_url, "HEAD"],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        encoding="utf-8",
+        check=True,
+        timeout=60,
+    )
+    line = result.stdout.strip()
+    return line.split()[0] if line else None
+
+
+def make_cache_key(repo_name, head_sha, parameters):
+    payload = json.dumps(
+        {"repo": repo_name.lower(), "head": head_sha, "parameters": parameters},
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """
+    Two-tier cache of finished analyses: an in-memory LRU in front of JSON files on
+    disk, so results survive restarts. Both tiers evict the least recently used entries.
+    """
+
+    def __init__(self, directory=RESULT_CACHE_DIR, memory_entries=RESULT_CACHE_MEMORY_ENTRIES,
+                 disk_entries=RESULT_CACHE_DISK_ENTRIES):
+        self.directory = directory
+        self.memory_entries = memory_entries
+        self.disk_entries = disk_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + ".json")
+
+    def _remember(self, key, result):
+        with self._lock:
+            self._memory[key] = result
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+
+    def get(self, key):
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return self._memory[key]
+
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as file:
+                result = json.load(file)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logging.error("Discarding unreadable cached result %s: %s", path, e)
+            return None
+        os.utime(path)
+        self._remember(key, result)
+        return result
+
+    def put(self, key, result):
+        self._remember(key, result)
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(key)
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump(result, file)
+        # Readers never see a half-written file.
+        os.replace(temp_path, path)
+        self._evict_disk()
+
+    def _evict_disk(self):
+        entries = [
+            os.path.join(self.directory, name)
+            for name in os.listdir(self.directory)
+            if name.endswith(".json")
+        ]
+        if len(entries) <= self.disk_entries:
+            return
+        entries.sort(key=os.path.getmtime)
+        for path in entries[:len(entries) - self.disk_entries]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+result_cache = ResultCache()
@@ -0,0 +1,78 @@
+import numpy as np
+
+
+def degree_centrality(graph, nodes):
+    """
+    Same values as nx.degree_centrality(graph), as an array aligned with `nodes`.
+    """
+    n = len(nodes)
+    if n <= 1:
+        return np.ones(n)
+    degrees = np.fromiter((graph.degree(node) for node in nodes), dtype=np.float64, count=n)
+    # networkx multiplies by 1/(n-1) rather than dividing; keep that for identical floats.
+    return degrees * (1.0 / (n - 1.0))
+
+
+def key_developers(names, scores, threshold):
+    """
+    Returns the highest scoring names whose cumulative score first reaches `threshold`
+    of the total score.
+    """
+    if not len(scores):
+        return []
+    # A stable sort on the negated scores keeps ties in insertion order, exactly like
+    # sorted(..., reverse=True). Totals are accumulated sequentially, like sum().
+    order = np.argsort(-scores, kind="stable")
+    total = np.add.accumulate(scores)[-1]
+    reached = np.add.accumulate(scores[order]) >= threshold * total
+    cut = int(np.argmax(reached)) + 1 if reached.any() else len(order)
+    return [names[i] for i in order[:cut].tolist()]
+
+
+def score_contributors(graph, loc_per_contributor, unique_files_per_contributor, jira_activity,
+                       normalize, weights):
+    """
+    Computes the custom centrality of every contributor in one vectorised pass over
+    arrays indexed by contributor ID (the node's position in `graph`).
+
+    score = degree centrality + loc weight * LOC / max LOC
+            + files weight * file count / max file count + jira weight * Jira activity
+
+    Jira users that match no graph node by normalized name get jira_only weight * activity.
+
+    :return: (custom_centrality, top_k_nodes, jira_only_nodes) where custom_centrality
+             maps node names (graph nodes first, then Jira-only users) to scores.
+    """
+    nodes = list(graph.nodes())
+    normalized = [normalize(node) for node in nodes]
+    count = len(nodes)
+
+    max_loc = max(loc_per_contributor.values()) if loc_per_contributor else 0
+    max_files = max((len(files) for files in unique_files_per_contributor.values()), default=0)
+    loc = np.fromiter((loc_per_contributor.get(name, 0) for name in normalized), dtype=np.float64, count=count)
+    file_counts = np.fromiter(
+        (len(unique_files_per_contributor.get(name, ())) for name in normalized), dtype=np.float64, count=count
+    )
+    jira = np.fromiter((jira_activity.get(name, 0) for name in normalized), dtype=np.float64, count=count)
+
+    scores = (
+        degree_centrality(graph, nodes)
+        + weights["loc"] * loc / (max_loc or 1)
+        + weights["files"] * file_counts / (max_files or 1)
+    )
+    scores = scores + weights["jira"] * jira
+
+    # Jira users are matched to graph nodes with one set lookup each.
+    known = set(normalized)
+    jira_only_nodes = [name for name in jira_activity if name not in known]
+    jira_only_scores = np.fromiter(
+        (weights["jira_only"] * jira_activity[name] for name in jira_only_nodes),
+        dtype=np.float64,
+        count=len(jira_only_nodes),
+    )
+
+    names = nodes + jira_only_nodes
+    all_scores = np.concatenate([scores, jira_only_scores])
+    custom_centrality = dict(zip(names, all_scores.tolist()))
+    top_k_nodes = key_developers(names, all_scores, weights["key_developer_threshold"])
+    return custom_centrality, top_k_nodes, jira_only_nodes
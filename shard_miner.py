@@ -0,0 +1,114 @@
+"""
+Commit mining and loading spread over a process pool.
+
+The analysis window is cut into contiguous shards of SHAs. Workers mine their shard's
+missing commits into the commit store, and later decode their shard from the store
+into a compact CommitTable. Shard tables are concatenated in shard order, so the result
+is the same table a single pass over the commits would build.
+"""
+import math
+import multiprocessing
+import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from commit_miner import iter_commits_by_sha, shallow_boundary
+from commit_store import commit_store
+from commit_table import CommitTable
+
+# Worker processes for mining/aggregation; 1 keeps everything in the calling process.
+MINING_WORKERS = int(os.getenv("MINING_WORKERS", str(os.cpu_count() or 1)))
+# Shards smaller than this aren't worth a round trip to a worker.
+MINING_MIN_SHARD_COMMITS = int(os.getenv("MINING_MIN_SHARD_COMMITS", "2000"))
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _executor():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: the server process has threads, which fork() doesn't mix well with
+            _pool = ProcessPoolExecutor(max_workers=MINING_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def _reset_executor():
+    global _pool
+    with _pool_lock:
+        _pool = None
+
+
+def shard(items, workers=MINING_WORKERS, min_shard=MINING_MIN_SHARD_COMMITS):
+    """
+    Splits `items` into contiguous shards: a few per worker so they even out, but none
+    smaller than `min_shard` (except a lone one).
+    """
+    count = max(1, min(workers * 4, len(items) // max(min_shard, 1)))
+    size = math.ceil(len(items) / count) if items else 0
+    return [items[start:start + size] for start in range(0, len(items), size)] if items else []
+
+
+def _run_shards(fn, shards, args, check=None, on_done=None):
+    """
+    Runs fn(shard, *args) for every shard and returns the results in shard order, on the
+    process pool or inline when there is a single shard or worker. check() is called
+    between shards; on_done(done, total) after each one.
+    """
+    if len(shards) <= 1 or MINING_WORKERS <= 1:
+        results = []
+        for i, items in enumerate(shards, start=1):
+            if check:
+                check()
+            results.append(fn(items, *args))
+            if on_done:
+                on_done(i, len(shards))
+        return results
+
+    executor = _executor()
+    futures = {}
+    try:
+        futures = {executor.submit(fn, items, *args): i for i, items in enumerate(shards)}
+        results = [None] * len(shards)
+        pending = set(futures)
+        while pending:
+            finished, pending = wait(pending, timeout=1, return_when=FIRST_COMPLETED)
+            for future in finished:
+                results[futures[future]] = future.result()
+            if check:
+                check()
+            if finished and on_done:
+                on_done(len(shards) - len(pending), len(shards))
+        return results
+    except BrokenProcessPool:
+        _reset_executor()
+        raise
+    finally:
+        for future in futures:
+            future.cancel()
+
+
+def _mine_shard(shas, repo_name, git_dir):
+    commit_store.add_commits(repo_name, iter_commits_by_sha(git_dir, shas), boundary_shas=shallow_boundary(git_dir))
+    return len(shas)
+
+
+def mine_commits(repo_name, git_dir, shas, check=None, on_done=None):
+    """
+    Mines the numstat records of `shas` into the commit store, one git process per shard.
+    """
+    return sum(_run_shards(_mine_shard, shard(shas), (repo_name, git_dir), check, on_done))
+
+
+def _load_shard(shas, repo_name):
+    return CommitTable.from_records(commit_store.iter_commits(repo_name, shas))
+
+
+def load_commit_table(repo_name, shas, check=None, on_done=None):
+    """
+    Reads the stored commits `shas` into a CommitTable, decoding and interning the
+    shards in parallel and concatenating them in order.
+    """
+    return CommitTable.concat(_run_shards(_load_shard, shard(shas), (repo_name,), check, on_done))
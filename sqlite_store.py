@@ -0,0 +1,48 @@
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+
+class SQLiteStore:
+    """
+    Base of the SQLite-backed stores: the database file (and its directory) is created on
+    first use, in WAL mode so readers don't block the writer, with the schema from
+    _create_schema(). Each _connect() opens its own connection, so threads and worker
+    processes can share a store.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.RLock()
+        self._initialised = False
+
+    def _create_schema(self, connection):
+        raise NotImplementedError
+
+    def _initialise(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        connection = sqlite3.connect(self.path, timeout=30)
+        try:
+            connection.execute("PRAGMA journal_mode=WAL")
+            self._create_schema(connection)
+            connection.commit()
+        finally:
+            connection.close()
+        self._initialised = True
+
+    @contextmanager
+    def _connect(self):
+        # Commits on success, rolls back on error
+        if not self._initialised:
+            with self._lock:
+                if not self._initialised:
+                    self._initialise()
+        connection = sqlite3.connect(self.path, timeout=30)
+        try:
+            with connection:
+                yield connection
+        finally:
+            connection.close()
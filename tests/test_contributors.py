@@ -0,0 +1,61 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import contributors
+from contributors import GraphQLError, IdentityCache, resolve_identities
+
+
+class _Response:
+    status_code = 200
+
+    def __init__(self, body):
+        self.body = body
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.body
+
+
+class ResolveIdentitiesTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.cache = IdentityCache(os.path.join(directory.name, "identities.sqlite3"))
+        for patcher in (mock.patch.object(contributors, "identity_cache", self.cache),
+                        mock.patch.object(contributors.github_client, "has_token", return_value=True)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _answer(self, body):
+        return mock.patch.object(contributors.github_client, "post", return_value=_Response(body))
+
+    def test_unknown_users_are_cached_as_without_identity(self):
+        body = {
+            "data": {"u0": {"login": "alice", "name": "Alice", "email": ""}, "u1": None},
+            "errors": [{"type": "NOT_FOUND", "path": ["u1"], "message": "Could not resolve to a User"}],
+        }
+        with self._answer(body):
+            identities = resolve_identities(["alice", "ghost"])
+        self.assertEqual(identities, {"alice": ("Alice", None), "ghost": (None, None)})
+        self.assertEqual(self.cache.get_many(["alice", "ghost"]), identities)
+
+    def test_errors_without_data_are_raised_and_not_cached(self):
+        body = {"data": None, "errors": [{"type": "RATE_LIMITED", "message": "API rate limit exceeded"}]}
+        with self._answer(body), self.assertRaisesRegex(GraphQLError, "rate limit"):
+            resolve_identities(["alice", "bob"])
+        self.assertEqual(self.cache.get_many(["alice", "bob"]), {})
+
+    def test_only_answered_users_are_cached(self):
+        with self._answer({"data": {"u0": {"login": "alice", "name": "Alice", "email": "a@example.com"}}}):
+            identities = resolve_identities(["alice", "bob"])
+        self.assertEqual(identities, {"alice": ("Alice", "a@example.com")})
+        self.assertEqual(self.cache.get_many(["alice", "bob"]), identities)
+
+
+if __name__ == "__main__":
+    unittest.main()
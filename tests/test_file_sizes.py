@@ -0,0 +1,57 @@
+import os
+import subprocess
+import tempfile
+import threading
+import unittest
+
+from file_sizes import BlobReader
+
+
+def _reader(script):
+    # A BlobReader whose "git cat-file --batch" is `script`
+    reader = BlobReader.__new__(BlobReader)
+    reader.process = subprocess.Popen(["sh", "-c", script], stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+    return reader
+
+
+class BlobReaderTest(unittest.TestCase):
+
+    def _count_lines(self, reader, sha):
+        # Run with a deadline: reading from a dead cat-file used to loop forever
+        outcome = []
+
+        def run():
+            try:
+                outcome.append(reader.count_lines(sha))
+            except Exception as e:
+                outcome.append(e)
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        thread.join(10)
+        self.assertFalse(thread.is_alive(), "count_lines did not return")
+        return outcome[0]
+
+    def test_counts_lines_of_blobs(self):
+        with tempfile.TemporaryDirectory() as repo:
+            subprocess.run(["git", "init", "--quiet", repo], check=True)
+            path = os.path.join(repo, "file.txt")
+            with open(path, "w", encoding="utf-8") as file:
+                file.write("one\ntwo\nthree\n")
+            sha = subprocess.run(["git", "-C", repo, "hash-object", "-w", path], stdout=subprocess.PIPE,
+                                 encoding="utf-8", check=True).stdout.strip()
+            with BlobReader(os.path.join(repo, ".git")) as reader:
+                self.assertEqual(self._count_lines(reader, sha), 4)
+                self.assertIsNone(self._count_lines(reader, "0" * 40))
+
+    def test_cat_file_exiting_before_the_header(self):
+        error = self._count_lines(_reader("read sha"), "a" * 40)
+        self.assertIsInstance(error, RuntimeError)
+
+    def test_cat_file_exiting_inside_a_blob(self):
+        error = self._count_lines(_reader('read sha; printf "%s blob 100\\nabc\\n" "$sha"'), "a" * 40)
+        self.assertIsInstance(error, RuntimeError)
+
+
+if __name__ == "__main__":
+    unittest.main()
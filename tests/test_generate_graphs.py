@@ -0,0 +1,63 @@
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+import generate_graphs
+import shard_miner
+from commit_store import CommitStore
+from mirror_store import MirrorStore, remove_readonly
+from test_mirror_store import _commit, make_fixture
+
+
+class GenerateGraphSetTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, onerror=remove_readonly)
+        source = os.path.join(self.root, "fixture", "repo")
+        os.makedirs(source)
+        make_fixture(source)
+        self.source = source
+        self.url = "file://" + source
+        self.store = MirrorStore(root=os.path.join(self.root, "mirrors"), max_bytes=float("inf"))
+        commit_store = CommitStore(os.path.join(self.root, "commit_stats.sqlite3"))
+        for patcher in (mock.patch.object(generate_graphs, "mirror_store", self.store),
+                        mock.patch.object(generate_graphs, "commit_store", commit_store),
+                        mock.patch.object(shard_miner, "commit_store", commit_store),
+                        mock.patch.object(generate_graphs, "fetch_contributors", return_value=[])):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_mirror_is_released_when_opening_it_fails(self):
+        with mock.patch.object(generate_graphs.git, "Repo", side_effect=OSError("unreadable")):
+            with self.assertRaises(OSError):
+                generate_graphs.generateGraphSet(self.url, lambda message: None)
+        self.assertEqual(self.store._users, {"fixture/repo": 0})
+
+
+    def _head(self):
+        return subprocess.run(["git", "-C", self.source, "rev-parse", "HEAD"], stdout=subprocess.PIPE,
+                              encoding="utf-8", check=True).stdout.strip()
+
+    def test_analyses_the_commit_the_cache_key_was_made_for(self):
+        looked_up = self._head()
+        # Pushed between the ls-remote and the fetch
+        _commit(self.source, int(time.time()), "alice", {"src/pushed.py": "pushed\n"})
+        graphs, analysed = generate_graphs._generate_graph_set_at(self.url, lambda message: None, head_sha=looked_up)
+        self.assertEqual(analysed, looked_up)
+        self.assertNotIn("src/pushed.py", str(graphs))
+
+        graphs, analysed = generate_graphs._generate_graph_set_at(self.url, lambda message: None)
+        self.assertEqual(analysed, self._head())
+        self.assertIn("src/pushed.py", str(graphs))
+
+        # Gone from the remote (force-push) before the mirror ever had it
+        graphs, analysed = generate_graphs._generate_graph_set_at(self.url, lambda message: None, head_sha="0" * 40)
+        self.assertEqual(analysed, self._head())
+
+if __name__ == "__main__":
+    unittest.main()
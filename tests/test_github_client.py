@@ -0,0 +1,124 @@
+"""
+GitHubClient against a stub HTTP server standing in for the GitHub API.
+"""
+import json
+import threading
+import time
+import unittest
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from github_client import BACKGROUND, GitHubClient, RateLimitScheduler, _retry_after
+
+
+class _GitHubStub(BaseHTTPRequestHandler):
+    # Answers every path with {"path": ...}, the ETag "v1" and decreasing core quota
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests.append((self.path, self.headers.get("If-None-Match")))
+            server.remaining -= 1
+            remaining = server.remaining
+        not_modified = self.headers.get("If-None-Match") == '"v1"'
+        body = b"" if not_modified else json.dumps({"path": self.path}).encode("utf-8")
+        self.send_response(304 if not_modified else 200)
+        self.send_header("ETag", '"v1"')
+        self.send_header("X-RateLimit-Limit", "5000")
+        # GitHub doesn't charge 304s
+        self.send_header("X-RateLimit-Remaining", str(remaining + 1 if not_modified else remaining))
+        self.send_header("X-RateLimit-Reset", str(server.reset))
+        self.send_header("X-RateLimit-Resource", "core")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class GitHubClientTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _GitHubStub)
+        self.server.lock = threading.Lock()
+        self.server.requests = []
+        self.server.remaining = 4000
+        self.server.reset = int(time.time()) + 3600
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def client(self, **kwargs):
+        client = GitHubClient(token="test", base_url=self.base_url, scheduler=RateLimitScheduler(), **kwargs)
+        self.addCleanup(client.session.close)
+        return client
+
+    def test_fresh_responses_are_served_from_the_cache(self):
+        client = self.client(cache_ttl=60)
+        first = client.get("repos/o/r")
+        second = client.get("repos/o/r")
+        self.assertIs(first, second)
+        self.assertEqual(self.server.requests, [("/repos/o/r", None)])
+
+    def test_stale_responses_are_revalidated_with_their_etag(self):
+        client = self.client(cache_ttl=0)
+        first = client.get("repos/o/r")
+        second = client.get("repos/o/r")
+        self.assertIs(first, second)
+        self.assertEqual(second.json(), {"path": "/repos/o/r"})
+        self.assertEqual(self.server.requests, [("/repos/o/r", None), ("/repos/o/r", '"v1"')])
+
+    def test_cache_keeps_the_most_recently_used_entries(self):
+        client = self.client(cache_ttl=60, cache_entries=2)
+        for path in ("a", "b", "a", "c", "a", "b"):
+            client.get(path)
+        # "b" was the least recently used when "c" came in
+        self.assertEqual([path for path, _ in self.server.requests], ["/a", "/b", "/c", "/b"])
+
+    def test_rate_limit_headers_update_the_scheduler(self):
+        client = self.client(cache_ttl=0)
+        client.get("repos/o/r")
+        buckets, _ = client.scheduler.snapshot()
+        self.assertEqual(buckets["core"], {"limit": 5000, "remaining": 3999, "reset": self.server.reset})
+        # A 304 isn't charged, so the quota GitHub reports flows back
+        client.get("repos/o/r")
+        buckets, _ = client.scheduler.snapshot()
+        self.assertEqual(buckets["core"]["remaining"], 3999)
+
+
+
+class RateLimitTest(unittest.TestCase):
+
+    def test_retry_after_takes_seconds_or_an_http_date(self):
+        self.assertEqual(_retry_after("120"), 120)
+        self.assertIn(_retry_after(formatdate(time.time() + 30, usegmt=True)), (30, 31))
+        self.assertEqual(_retry_after(formatdate(time.time() - 30, usegmt=True)), 0)
+        self.assertEqual(_retry_after("soon"), 60)
+        self.assertEqual(_retry_after(None), 60)
+
+    def test_update_trusts_github_less_requests_in_flight(self):
+        scheduler = RateLimitScheduler()
+        reset = int(time.time()) + 3600
+        scheduler.update("core", 5000, 4000, reset)
+        scheduler.acquire("core", BACKGROUND)
+        scheduler.acquire("core", BACKGROUND)
+        # A response produced before the two requests above were charged
+        scheduler.update("core", 5000, 3990, reset)
+        self.assertEqual(scheduler.snapshot()[0]["core"]["remaining"], 3988)
+        scheduler.release("core")
+        scheduler.release("core")
+        # Quota GitHub didn't charge (e.g. 304s) comes back
+        scheduler.update("core", 5000, 3995, reset)
+        self.assertEqual(scheduler.snapshot()[0]["core"]["remaining"], 3995)
+
+    def test_update_ignores_a_response_from_an_earlier_window(self):
+        scheduler = RateLimitScheduler()
+        reset = int(time.time()) + 3600
+        scheduler.update("core", 5000, 4999, reset)
+        scheduler.update("core", 5000, 2, reset - 3600)
+        self.assertEqual(scheduler.snapshot()[0]["core"], {"limit": 5000, "remaining": 4999, "reset": reset})
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,44 @@
+import os
+import subprocess
+import tempfile
+import unittest
+
+from identity import check_mailmap
+
+
+class CheckMailmapTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.repo = directory.name
+        with open(os.path.join(self.repo, ".mailmap"), "w", encoding="utf-8") as file:
+            file.write("Alice Smith <alice@example.com> <alice@old.example.com>\n"
+                       "<bob@example.com> <bob@old.example.com>\n")
+        for args in (["init", "--quiet"], ["add", ".mailmap"],
+                     ["-c", "user.name=Test", "-c", "user.email=test@example.com", "commit", "--quiet", "-m", "mailmap"]):
+            subprocess.run(["git", "-C", self.repo, *args], check=True)
+        # Bare, like the mirrors: git reads .mailmap from HEAD
+        self.git_dir = os.path.join(self.repo, "bare.git")
+        subprocess.run(["git", "clone", "--quiet", "--bare", self.repo, self.git_dir], check=True)
+
+    def test_maps_names_and_emails(self):
+        mapped = check_mailmap(self.git_dir, [
+            ("alice", "alice@old.example.com"),
+            ("Bob", "bob@old.example.com"),
+            ("Carol", "carol@example.com"),
+        ])
+        self.assertEqual(mapped, {
+            ("alice", "alice@old.example.com"): ("Alice Smith", "alice@example.com"),
+            ("Bob", "bob@old.example.com"): ("Bob", "bob@example.com"),
+            ("Carol", "carol@example.com"): ("Carol", "carol@example.com"),
+        })
+
+    def test_empty_name_keeps_the_whole_email(self):
+        # check-mailmap prints just "<email>" for these
+        mapped = check_mailmap(self.git_dir, [("", "bob@old.example.com"), ("", "dave <x>@example.com")])
+        self.assertEqual(mapped, {("", "bob@old.example.com"): ("", "bob@example.com")})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,205 @@
+"""
+MirrorStore against a local file:// fixture repository: incremental fetches, locking,
+eviction, and that every clone strategy mines the same analysis window as a full clone.
+
+Run with: python -m pytest tests
+"""
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+import unittest
+
+from commit_miner import history_window, iter_commits, iter_commits_by_sha, list_commits, shallow_boundary
+from commit_store import CommitStore
+from commit_table import CommitAggregates, CommitTable
+from identity import normalize_name
+from mirror_store import CLONE_STRATEGIES, MirrorStore, remove_readonly
+
+DAY = 86400
+
+
+def _git(cwd, *args, env=None):
+    subprocess.run(["git", *args], cwd=cwd, check=True, stdout=subprocess.DEVNULL,
+                   env={**os.environ, **(env or {})})
+
+
+def _commit(repo, timestamp, author, files):
+    for path, text in files.items():
+        full_path = os.path.join(repo, path)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        with open(full_path, "a", encoding="utf-8") as file:
+            file.write(text)
+    _git(repo, "add", "-A")
+    name = author.title()
+    _git(repo, "-c", f"user.name={name}", "-c", f"user.email={author}@example.com",
+         "commit", "--quiet", "-m", f"{author} at {timestamp}",
+         env={"GIT_AUTHOR_DATE": f"@{timestamp}", "GIT_COMMITTER_DATE": f"@{timestamp}"})
+
+
+def make_fixture(repo):
+    """
+    Three years of weekly commits by a few authors, so the 547-day window starts well
+    inside the history and its oldest commits have parents outside it.
+    """
+    _git(repo, "init", "--quiet", "-b", "main")
+    now = int(time.time())
+    authors = ["alice", "bob", "carol", "dependabot"]
+    for week in range(156):
+        author = authors[week % len(authors)]
+        files = {f"src/module_{week % 5}.py": f"line {week}\n" * (week % 7 + 1)}
+        if author == "dependabot":
+            files["requirements.txt"] = f"package=={week}\n"
+        _commit(repo, now - (156 - week) * 7 * DAY, author, files)
+
+
+def window(git_dir, rev="HEAD"):
+    _, cutoff, count = history_window(git_dir, rev)
+    return list(iter_commits(git_dir, rev, since=cutoff, max_count=count))
+
+
+def aggregates(table):
+    authors = {author: (author[0], author[1], normalize_name(author[0]), False) for author in table.authors.values}
+    return CommitAggregates(table, authors)
+
+
+class MirrorStoreTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.fixture_dir = tempfile.mkdtemp()
+        cls.source = os.path.join(cls.fixture_dir, "source")
+        os.makedirs(cls.source)
+        make_fixture(cls.source)
+        cls.url = "file://" + cls.source
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.fixture_dir, onerror=remove_readonly)
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.store = MirrorStore(root=os.path.join(self.root, "mirrors"), max_bytes=float("inf"))
+
+    def tearDown(self):
+        shutil.rmtree(self.root, onerror=remove_readonly)
+
+    def test_fetches_new_commits_into_existing_mirror(self):
+        first = self.store.acquire("fixture/repo", self.url)
+        self.store.release("fixture/repo")
+
+        _commit(self.source, int(time.time()), "alice", {"src/new.py": "new\n"})
+        try:
+            second = self.store.acquire("fixture/repo", self.url)
+            self.store.release("fixture/repo")
+        finally:
+            _git(self.source, "reset", "--quiet", "--hard", first.head)
+
+        self.assertEqual(first.path, second.path)
+        self.assertNotEqual(first.head, second.head)
+        self.assertEqual(window(second.path, second.head)[0].files, [("src/new.py", 1, 0)])
+
+    def test_strategies_mine_the_full_clone_window(self):
+        expected = None
+        for strategy in CLONE_STRATEGIES:
+            with self.subTest(strategy=strategy):
+                mirror = self.store.acquire("fixture/repo", self.url, strategy=strategy)
+                try:
+                    commits = window(mirror.path, mirror.head)
+                finally:
+                    self.store.release("fixture/repo", strategy)
+                if expected is None:
+                    expected = commits
+                    self.assertGreater(len(expected), 50)
+                self.assertEqual(commits, expected)
+
+    def _analyse(self, store, git_dir, head):
+        # What generateGraphSet does with the commit store, minus the GitHub parts
+        _, cutoff, count = history_window(git_dir, head)
+        shas = [sha for sha, _ in list_commits(git_dir, head, since=cutoff, max_count=count)]
+        boundary = shallow_boundary(git_dir)
+        missing = store.missing_shas("fixture/repo", shas, boundary_shas=boundary)
+        store.add_commits("fixture/repo", iter_commits_by_sha(git_dir, missing), boundary_shas=boundary)
+        table = CommitTable.from_records(store.iter_commits("fixture/repo", shas))
+        return dict(aggregates(table).loc_per_contributor)
+
+    def _analyse_strategy(self, store, strategy):
+        mirror = self.store.acquire("fixture/repo", self.url, strategy=strategy)
+        try:
+            return self._analyse(store, mirror.path, mirror.head)
+        finally:
+            self.store.release("fixture/repo", strategy)
+
+    def test_shallow_runs_do_not_change_a_later_full_analysis(self):
+        full_only = self._analyse_strategy(CommitStore(os.path.join(self.root, "full.sqlite3")), "full")
+
+        store = CommitStore(os.path.join(self.root, "shallow-first.sqlite3"))
+        # A clone whose boundary sits inside the window (what an ignored --shallow-since
+        # left behind): its boundary commit counts every file as added
+        too_shallow = os.path.join(self.root, "too-shallow.git")
+        _git(self.root, "clone", "--quiet", "--mirror", "--depth=2", self.url, too_shallow)
+        self.assertTrue(shallow_boundary(too_shallow))
+        self._analyse(store, too_shallow, "HEAD")
+        self.assertEqual(self._analyse_strategy(store, "shallow"), full_only)
+
+        self.assertEqual(self._analyse_strategy(store, "full"), full_only)
+
+    def test_pull_request_refs_are_not_fetched(self):
+        head = subprocess.run(["git", "-C", self.source, "rev-parse", "HEAD~3"], stdout=subprocess.PIPE,
+                              encoding="utf-8", check=True).stdout.strip()
+        _git(self.source, "update-ref", "refs/pull/1/head", head)
+        try:
+            # A mirror left by `clone --mirror` is switched over on its next fetch
+            legacy = self.store.path_for("fixture/legacy")
+            _git(self.root, "clone", "--quiet", "--mirror", self.url, legacy)
+            for repo_name in ("fixture/repo", "fixture/legacy"):
+                for _ in range(2):
+                    mirror = self.store.acquire(repo_name, self.url)
+                    self.store.release(repo_name)
+                refs = subprocess.run(["git", "--git-dir", mirror.path, "for-each-ref", "--format=%(refname)"],
+                                      stdout=subprocess.PIPE, encoding="utf-8", check=True).stdout.split()
+                self.assertEqual(refs, ["refs/heads/main"])
+        finally:
+            _git(self.source, "update-ref", "-d", "refs/pull/1/head")
+
+    def test_url_is_never_read_as_an_option(self):
+        marker = os.path.join(self.root, "ran")
+        with self.assertRaises(subprocess.CalledProcessError):
+            self.store.acquire("fixture/evil", f"--upload-pack=touch {marker};")
+        self.store.acquire("fixture/repo", self.url)
+        self.store.release("fixture/repo")
+        with self.assertRaises(subprocess.CalledProcessError):
+            self.store.acquire("fixture/repo", f"--upload-pack=touch {marker};")
+        self.assertFalse(os.path.exists(marker))
+
+    def test_mirror_is_not_locked_while_in_use(self):
+        self.store.acquire("fixture/repo", self.url)
+        acquired = threading.Event()
+
+        def second_request():
+            self.store.acquire("fixture/repo", self.url)
+            acquired.set()
+            self.store.release("fixture/repo")
+
+        thread = threading.Thread(target=second_request)
+        thread.start()
+        thread.join(timeout=30)
+        self.store.release("fixture/repo")
+        self.assertTrue(acquired.is_set())
+
+    def test_eviction_skips_mirrors_in_use(self):
+        self.store.max_bytes = 0
+        in_use = self.store.acquire("fixture/repo", self.url)
+        idle = self.store.acquire("fixture/other", self.url)
+        self.store.release("fixture/other")
+
+        self.assertTrue(os.path.isdir(in_use.path))
+        self.assertFalse(os.path.isdir(idle.path))
+        self.store.release("fixture/repo")
+        self.assertFalse(os.path.isdir(in_use.path))
+
+
+if __name__ == "__main__":
+    unittest.main()
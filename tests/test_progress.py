@@ -0,0 +1,40 @@
+import unittest
+
+from progress import ProgressReporter
+
+
+class _SocketIO:
+    def __init__(self):
+        self.sent = []
+
+    def emit(self, event, data, to=None, namespace=None):
+        self.sent.append((to, data["message"]))
+
+
+class ProgressReporterTest(unittest.TestCase):
+
+    def test_late_subscriber_gets_the_final_message(self):
+        socketio = _SocketIO()
+        reporter = ProgressReporter(socketio, "job", max_rate_hz=0)
+        reporter("Starting graph generation...")
+        reporter.final("Graph generation complete!")
+        reporter.replay("late-client")
+        self.assertEqual(socketio.sent[-1], ("late-client", "Graph generation complete!"))
+
+    def test_late_subscriber_gets_the_held_back_message(self):
+        socketio = _SocketIO()
+        reporter = ProgressReporter(socketio, "job", max_rate_hz=0.001)
+        reporter("Fetching contributors...")
+        reporter("Mining commits...")
+        reporter.replay("late-client")
+        self.assertEqual(socketio.sent, [("job", "Fetching contributors..."), ("late-client", "Mining commits...")])
+        reporter.final("Graph generation complete!")
+
+    def test_nothing_is_replayed_before_the_first_message(self):
+        socketio = _SocketIO()
+        ProgressReporter(socketio, "job").replay("late-client")
+        self.assertEqual(socketio.sent, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,20 @@
+import os
+import subprocess
+import tempfile
+import unittest
+
+from result_cache import remote_head
+
+
+class RemoteHeadTest(unittest.TestCase):
+
+    def test_url_is_never_read_as_an_option(self):
+        with tempfile.TemporaryDirectory() as root:
+            marker = os.path.join(root, "ran")
+            with self.assertRaises(subprocess.CalledProcessError):
+                remote_head(f"--upload-pack=touch {marker};")
+            self.assertFalse(os.path.exists(marker))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,69 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from mirror_store import MirrorStore, remove_readonly
+from test_mirror_store import make_fixture
+from workspace import WorkspaceManager
+
+
+class WorkspaceManagerTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.fixture_dir = tempfile.mkdtemp()
+        source = os.path.join(cls.fixture_dir, "source")
+        os.makedirs(source)
+        make_fixture(source)
+        cls.url = "file://" + source
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.fixture_dir, onerror=remove_readonly)
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, onerror=remove_readonly)
+        store = MirrorStore(root=os.path.join(self.root, "mirrors"), max_bytes=float("inf"))
+        self.manager = WorkspaceManager(root=os.path.join(self.root, "workspaces"), store=store)
+
+    def test_same_commit_shares_one_tree(self):
+        with self.manager.workspace("fixture/repo", self.url) as first, \
+                self.manager.workspace("fixture/repo", self.url) as second:
+            self.assertEqual(first, second)
+            self.assertTrue(os.path.isfile(os.path.join(first, "requirements.txt")))
+
+    def test_slow_tree_does_not_block_other_repositories(self):
+        materialise = WorkspaceManager._materialise
+        building = threading.Event()
+        finish = threading.Event()
+
+        def slow_materialise(mirror, path):
+            if "slow" in mirror.path:
+                building.set()
+                finish.wait(30)
+            materialise(mirror, path)
+
+        with mock.patch.object(WorkspaceManager, "_materialise", staticmethod(slow_materialise)):
+            slow = threading.Thread(target=self.manager.acquire, args=("fixture/slow", self.url))
+            slow.start()
+            try:
+                self.assertTrue(building.wait(30))
+                quick = []
+                thread = threading.Thread(target=lambda: quick.append(self.manager.acquire("fixture/quick", self.url)))
+                thread.start()
+                thread.join(10)
+                # Built while the slow tree still is
+                self.assertEqual(len(quick), 1)
+                self.assertTrue(os.path.isdir(quick[0]))
+                self.manager.release(quick[0])
+            finally:
+                finish.set()
+                slow.join(30)
+
+
+if __name__ == "__main__":
+    unittest.main()
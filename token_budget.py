@@ -0,0 +1,100 @@
+"""
+Token counting of repomix output against the documentation model's input budget.
+
+The output file is read in chunks and tokenized as it streams, one `<file path="...">`
+section at a time, so the counting stops as soon as the budget is exceeded. Each
+file's tokens are recorded; files past that point get an estimate from their size
+instead, so oversized inputs can still be trimmed by their largest files.
+"""
+import os
+from collections import namedtuple
+from functools import lru_cache
+
+import tiktoken
+
+REPOMIX_TOKEN_LIMIT = int(os.getenv("REPOMIX_TOKEN_LIMIT", "120000"))
+TOKEN_MODEL = os.getenv("TOKEN_MODEL", "gpt-3.5-turbo")
+# Text tokenized per encode() call; long files are split at line ends.
+TOKEN_CHUNK_BYTES = 256 * 1024
+
+# Text outside any file section (repomix's header and directory listing)
+HEADER = ""
+
+# total: tokens counted (when exceeded, those read before counting stopped)
+# files: {path: tokens} in file order, tokens outside file sections under HEADER
+# estimated: paths counted from their size after the budget ran out
+# text: the whole output, or None when the budget was exceeded
+TokenCount = namedtuple("TokenCount", ["total", "exceeded", "files", "estimated", "text"])
+
+
+@lru_cache(maxsize=None)
+def encoder(model=TOKEN_MODEL):
+    # Building the encoding is the slow part, so it is done once per model and process
+    return tiktoken.encoding_for_model(model)
+
+
+def largest_files(count, n=20):
+    """
+    The `n` files with the most tokens of a TokenCount, as [{"path", "tokens", "estimated"}].
+    """
+    files = sorted(
+        ((path, tokens) for path, tokens in count.files.items() if path != HEADER),
+        key=lambda item: item[1], reverse=True,
+    )
+    return [
+        {"path": path, "tokens": tokens, "estimated": path in count.estimated}
+        for path, tokens in files[:n]
+    ]
+
+
+def _sections(file):
+    # Yields (path, text chunk) pairs for the repomix XML `file`, in order
+    path = HEADER
+    chunk = []
+    size = 0
+    for line in file:
+        if line.startswith('<file path="'):
+            if chunk:
+                yield path, "".join(chunk)
+            path = line[len('<file path="'):line.rindex('"')]
+            chunk, size = [line], len(line)
+            continue
+        chunk.append(line)
+        size += len(line)
+        if line.startswith("</file>"):
+            yield path, "".join(chunk)
+            path = HEADER
+            chunk, size = [], 0
+        elif size >= TOKEN_CHUNK_BYTES:
+            yield path, "".join(chunk)
+            chunk, size = [], 0
+    if chunk:
+        yield path, "".join(chunk)
+
+
+def count_tokens(output_file, limit=REPOMIX_TOKEN_LIMIT, model=TOKEN_MODEL):
+    """
+    Counts the tokens of the repomix output `output_file`, stopping at `limit`.
+    """
+    encoding = encoder(model)
+    files = {}
+    estimated = set()
+    total = 0
+    text = []
+    chars_per_token = None
+    with open(output_file, "r", encoding="utf-8") as file:
+        for path, chunk in _sections(file):
+            if chars_per_token is None:
+                # encode_ordinary: file contents may contain special-token text
+                tokens = len(encoding.encode_ordinary(chunk))
+                total += tokens
+                if total > limit:
+                    chars_per_token = max(sum(map(len, text)) + len(chunk), 1) / max(total, 1)
+                    text = None
+                else:
+                    text.append(chunk)
+            else:
+                tokens = round(len(chunk) / chars_per_token)
+                estimated.add(path)
+            files[path] = files.get(path, 0) + tokens
+    return TokenCount(total, chars_per_token is not None, files, estimated, "".join(text) if text is not None else None)
@@ -0,0 +1,165 @@
+"""
+Working trees of analysed repositories, materialised from the cached bare mirrors.
+
+/generate_graphs reads the bare mirror directly; features that need files on disk
+(repomix for /process_repo) get a working tree here instead of cloning the repository
+again. A workspace is a shallow local clone of the mirror's HEAD, shared by everyone
+asking for the same repository at the same commit and reference counted; a few idle
+ones are kept for reuse.
+"""
+import logging
+import os
+import pathlib
+import shutil
+import subprocess
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from mirror_store import mirror_store, remove_readonly
+
+WORKSPACE_DIR = os.path.join(os.getenv("BUSFACTOR_DATA_DIR", "data"), "workspaces")
+# Idle working trees kept for reuse; the least recently used beyond this are deleted.
+WORKSPACE_MAX_IDLE = int(os.getenv("WORKSPACE_MAX_IDLE", "4"))
+# A mirror fetched less than this many seconds ago (e.g. by a graph analysis) is used as is.
+WORKSPACE_FETCH_MAX_AGE = int(os.getenv("WORKSPACE_FETCH_MAX_AGE", "300"))
+
+
+def _rmtree(path):
+    try:
+        shutil.rmtree(path, onerror=remove_readonly)
+    except PermissionError:
+        time.sleep(0.5)
+        shutil.rmtree(path, onerror=remove_readonly)
+
+
+class WorkspaceManager:
+    """
+    Reference-counted working trees keyed by (repository, HEAD SHA).
+    """
+
+    def __init__(self, root=WORKSPACE_DIR, max_idle=WORKSPACE_MAX_IDLE, store=mirror_store):
+        self.root = root
+        self.max_idle = max_idle
+        self.store = store
+        self._lock = threading.Lock()
+        # key -> [lock, requests using it]. The lock is held while that tree is created,
+        # so two requests never build the same one; other trees are built alongside.
+        self._materialise_locks = {}
+        # key -> [path, refs, last used, created]
+        self._workspaces = {}
+        self._keys = {}
+        self._cleaned = False
+
+    def acquire(self, repo_name, remote_url):
+        """
+        Returns the path of a working tree of `repo_name`'s current HEAD. Pass it to
+        release() when done; the tree must be treated as read-only.
+        """
+        with self._lock:
+            if not self._cleaned:
+                # Trees left behind by an earlier process aren't tracked, start afresh
+                if os.path.isdir(self.root):
+                    _rmtree(self.root)
+                self._cleaned = True
+
+        mirror = self.store.acquire(repo_name, remote_url, max_age=WORKSPACE_FETCH_MAX_AGE)
+        try:
+            key = (repo_name.lower(), mirror.head)
+            with self._lock:
+                materialise = self._materialise_locks.setdefault(key, [threading.Lock(), 0])
+                materialise[1] += 1
+            try:
+                with materialise[0]:
+                    return self._workspace(repo_name, mirror, key)
+            finally:
+                with self._lock:
+                    materialise[1] -= 1
+                    if not materialise[1]:
+                        del self._materialise_locks[key]
+        finally:
+            self.store.release(repo_name)
+            self._evict()
+
+    def _workspace(self, repo_name, mirror, key):
+        # Reuses or creates the tree of `key`, holding its materialise lock
+        with self._lock:
+            workspace = self._workspaces.get(key)
+            if workspace is not None:
+                workspace[1] += 1
+                workspace[2] = time.time()
+                logging.info("Reusing workspace of %s at %s", repo_name, mirror.head[:12])
+                return workspace[0]
+
+        owner, name = repo_name.split("/", 1)
+        path = os.path.join(self.root, owner, f"{name}@{mirror.head[:12]}-{uuid.uuid4().hex[:8]}")
+        logging.info("Creating workspace of %s at %s", repo_name, mirror.head[:12])
+        try:
+            self._materialise(mirror, path)
+        except Exception:
+            if os.path.isdir(path):
+                _rmtree(path)
+            raise
+        with self._lock:
+            self._workspaces[key] = [path, 1, time.time(), time.time()]
+            self._keys[path] = key
+        return path
+
+    @staticmethod
+    def _materialise(mirror, path):
+        # Only the snapshot SHA's tree is copied out of the mirror (file:// so --depth
+        # applies), whatever its HEAD points to by now
+        def run(*args):
+            subprocess.run(["git", "-C", path, *args], check=True)
+
+        os.makedirs(path)
+        run("init", "--quiet")
+        run("fetch", "--quiet", "--depth", "1", pathlib.Path(mirror.path).resolve().as_uri(), mirror.head)
+        run("-c", "advice.detachedHead=false", "checkout", "--quiet", "FETCH_HEAD")
+
+    def release(self, path):
+        with self._lock:
+            workspace = self._workspaces[self._keys[path]]
+            workspace[1] -= 1
+            workspace[2] = time.time()
+        self._evict()
+
+    @contextmanager
+    def workspace(self, repo_name, remote_url):
+        path = self.acquire(repo_name, remote_url)
+        try:
+            yield path
+        finally:
+            self.release(path)
+
+    def _evict(self):
+        """
+        Deletes idle trees of superseded commits, then the least recently used idle
+        trees beyond `max_idle`. Trees in use are never touched.
+        """
+        with self._lock:
+            newest = {}
+            for (repo, _), (_, _, _, created) in self._workspaces.items():
+                newest[repo] = max(newest.get(repo, 0), created)
+            idle = sorted(
+                (used, key) for key, (_, refs, used, _) in self._workspaces.items() if refs == 0
+            )
+            stale = [key for _, key in idle if self._workspaces[key][3] < newest[key[0]]]
+            current = [key for _, key in idle if self._workspaces[key][3] >= newest[key[0]]]
+            doomed = stale + current[:max(0, len(current) - self.max_idle)]
+            paths = []
+            for key in doomed:
+                path = self._workspaces.pop(key)[0]
+                del self._keys[path]
+                paths.append(path)
+
+        for path in paths:
+            logging.info("Removing workspace %s", path)
+            try:
+                _rmtree(path)
+            except OSError as e:
+                logging.error("Could not remove workspace %s: %s", path, e)
+
+
+workspace_manager = WorkspaceManager()